@@ -0,0 +1,450 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import chain
+from statistics import median
+
+from process_data import ColumnarQueryExecutor, DatabaseManager, DataLoader, DataSerializer, QueryExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STUDENTS_FILE = os.path.join(HERE, 'students (1).json')
+ROOMS_FILE = os.path.join(HERE, 'rooms (1).json')
+
+
+def shipped_students():
+    """Returns the records of the shipped students file."""
+    with open(STUDENTS_FILE, 'r') as f:
+        return json.load(f)
+
+
+def write_students(path, count, first_id=0):
+    """Writes `count` students by cycling through the shipped file with fresh ids, one record at a time."""
+    students = shipped_students()
+    with open(path, 'w') as out:
+        out.write('[\n')
+        for next_id in range(first_id, first_id + count):
+            if next_id > first_id:
+                out.write(',\n')
+            out.write(json.dumps(dict(students[next_id % len(students)], id=next_id)))
+        out.write('\n]\n')
+    return count
+
+
+def parse_count(value):
+    """Parses student counts such as 10000, 10k or 1M."""
+    multipliers = {'k': 10**3, 'm': 10**6}
+    suffix = value[-1].lower()
+    if suffix in multipliers:
+        return int(float(value[:-1]) * multipliers[suffix])
+    return int(value)
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in megabytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def ingest_worker(mode, students_file, db_path):
+    """Loads one students file in the current process and prints rows/sec and peak memory as JSON."""
+    db_manager = DatabaseManager(db_path)
+    db_manager.create_schema()
+    start = time.perf_counter()
+    if mode == 'stream':
+        DataLoader(db_manager).load_data(students_file, ROOMS_FILE)
+    else:
+        # The previous whole-file approach, kept here as the comparison baseline.
+        with open(ROOMS_FILE, 'r') as f:
+            rooms_data = json.load(f)
+        db_manager.cursor.executemany('INSERT INTO rooms (id, name) VALUES (?, ?)',
+                                      [(room['id'], room['name']) for room in rooms_data])
+        with open(students_file, 'r') as f:
+            students_data = json.load(f)
+        db_manager.cursor.executemany(
+            'INSERT INTO students (id, name, birthday, birth_year, sex, room_id) VALUES (?, ?, ?, ?, ?, ?)',
+            [DataLoader.student_row(s) for s in students_data]
+        )
+        db_manager.conn.commit()
+    elapsed = time.perf_counter() - start
+    rows = db_manager.execute_query('SELECT COUNT(*) FROM students')[0][0]
+    db_manager.close()
+    print(json.dumps({'mode': mode, 'rows': rows, 'seconds': elapsed,
+                      'rows_per_sec': rows / elapsed, 'peak_rss_mb': peak_rss_mb()}))
+
+
+def run_worker(*args):
+    """Runs a benchmark worker in a fresh interpreter so peak memory is measured in isolation."""
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), *args],
+                          capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def bench_ingest(args):
+    """Compares streaming ingestion with whole-file json.load on a scaled-up students file."""
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmp:
+        students_file = os.path.join(tmp, 'students.json')
+        rows = write_students(students_file, args.scale * len(shipped_students()))
+        size_mb = os.path.getsize(students_file) / 2**20
+        print(f"Generated {rows} students ({size_mb:.1f} MB) at scale {args.scale}x")
+        for mode in args.modes:
+            db_path = os.path.join(tmp, f'{mode}.db')
+            result = run_worker('_ingest-worker', mode, students_file, db_path)
+            os.remove(db_path)
+            print(f"{mode:>10}: {result['rows']} rows in {result['seconds']:.2f}s, "
+                  f"{result['rows_per_sec']:,.0f} rows/sec, peak RSS {result['peak_rss_mb']:.1f} MB")
+
+
+def bench_bulk(args):
+    """Compares load + index time of the bulk-load path with row-by-row index maintenance."""
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmp:
+        for count in args.sizes:
+            students_file = os.path.join(tmp, 'students.json')
+            write_students(students_file, count)
+            for mode in ('indexed', 'bulk'):
+                db_path = os.path.join(tmp, f'{mode}.db')
+                db_manager = DatabaseManager(db_path)
+                db_manager.create_schema()
+                data_loader = DataLoader(db_manager)
+                start = time.perf_counter()
+                if mode == 'bulk':
+                    data_loader.bulk_load(students_file, ROOMS_FILE)
+                else:
+                    db_manager.create_indexes()
+                    data_loader.load_data(students_file, ROOMS_FILE)
+                elapsed = time.perf_counter() - start
+                db_manager.close()
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(db_path + suffix):
+                        os.remove(db_path + suffix)
+                print(f"{count:>10} students {mode:>8}: {elapsed:.2f}s load + index, {count / elapsed:,.0f} rows/sec")
+            os.remove(students_file)
+
+
+def loaded_database(students_file):
+    """Returns an in-memory database bulk loaded with the given students file."""
+    db_manager = DatabaseManager()
+    db_manager.create_schema()
+    DataLoader(db_manager).bulk_load(students_file, ROOMS_FILE)
+    return db_manager
+
+
+def bench_queries(args):
+    """Times every QueryExecutor strategy against per-query and checks the results agree."""
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmp:
+        for count in args.sizes:
+            students_file = os.path.join(tmp, 'students.json')
+            write_students(students_file, count)
+            db_manager = loaded_database(students_file)
+            totals, results = {}, {}
+            for strategy in QueryExecutor.STRATEGIES:
+                query_executor = QueryExecutor(db_manager, strategy)
+                runs = []
+                for _ in range(args.repeat):
+                    results[strategy] = query_executor.get_query_results()
+                    runs.append(query_executor.timings['total'])
+                totals[strategy] = median(runs)
+                steps = ', '.join(f"{step} {seconds * 1000:.1f} ms"
+                                  for step, seconds in query_executor.timings.items() if step != 'total')
+                print(f"{count:>10} students {strategy:>12}: {totals[strategy] * 1000:.1f} ms median ({steps})")
+            # max_age_diff_rooms depends on julianday('now'), so compare everything else exactly
+            for strategy in QueryExecutor.STRATEGIES[1:]:
+                same = all(results['per-query'][key] == results[strategy][key]
+                           for key in results['per-query'] if key != 'max_age_diff_rooms')
+                print(f"{count:>10} students {strategy} speedup: {totals['per-query'] / totals[strategy]:.2f}x, "
+                      f"results {'match' if same else 'DIFFER'}")
+            db_manager.close()
+            os.remove(students_file)
+
+
+def bench_engines(args):
+    """Compares the SQLite and columnar engines across data sizes and checks their output is byte-identical."""
+    engines = {
+        'sqlite': lambda db: QueryExecutor(db, 'per-query'),
+        'sqlite-single-pass': lambda db: QueryExecutor(db, 'single-pass'),
+        'columnar': ColumnarQueryExecutor,
+    }
+    serializer = DataSerializer()
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmp:
+        for count in args.sizes:
+            students_file = os.path.join(tmp, 'students.json')
+            write_students(students_file, count)
+            db_manager = loaded_database(students_file)
+            outputs = {}
+            for name, make_executor in engines.items():
+                query_executor = make_executor(db_manager)
+                runs = []
+                for _ in range(args.repeat):
+                    results = query_executor.get_query_results()
+                    runs.append(query_executor.timings['total'])
+                # max_age_diff_rooms depends on the current time, so it is left out of the comparison
+                del results['max_age_diff_rooms']
+                outputs[name] = serializer.to_json(results)
+                print(f"{count:>10} students {name:>18}: {median(runs) * 1000:.1f} ms median")
+            same = len(set(outputs.values())) == 1
+            print(f"{count:>10} students output {'identical' if same else 'DIFFERS'} across engines")
+            db_manager.close()
+            os.remove(students_file)
+
+
+def bench_shards(args):
+    """Measures sharded ingestion throughput for increasing process pool sizes."""
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmp:
+        per_shard = args.students // args.shards
+        shard_files = []
+        for shard in range(args.shards):
+            path = os.path.join(tmp, f'students-{shard:04d}.json')
+            write_students(path, per_shard, shard * per_shard)
+            shard_files.append(path)
+        for workers in args.workers:
+            db_manager = DatabaseManager()
+            db_manager.create_schema()
+            start = time.perf_counter()
+            results = DataLoader(db_manager).bulk_load(shard_files, ROOMS_FILE, workers)
+            elapsed = time.perf_counter() - start
+            rows = sum(result.rows for result in results[1:])
+            failed = sum(result.status == 'failed' for result in results)
+            db_manager.close()
+            print(f"{workers:>3} workers: {rows} students from {args.shards} shards in {elapsed:.2f}s, "
+                  f"{rows / elapsed:,.0f} rows/sec, {failed} failed")
+
+
+class NullWriter:
+    """A text/binary sink that discards everything written to it."""
+    def write(self, data):
+        return len(data)
+
+
+def count_blocks(rows, counts):
+    """
+    Yields `rows`, adding to counts['blocks'] how many more blocks sys.getallocatedblocks() reports
+    at each row than at the one before: the blocks allocated for a row and still held when the
+    next is read, such as buffered output or garbage left for the cycle collector.
+    """
+    previous = sys.getallocatedblocks()
+    for row in rows:
+        current = sys.getallocatedblocks()
+        counts['blocks'] += max(current - previous, 0)
+        previous = current
+        yield row
+
+
+class PreviousSerializer(DataSerializer):
+    """
+    The streaming serializer as it was before the table-driven layouts, kept as the comparison
+    baseline: a dict per row from format_row, json.dumps per row, and lxml elements per row.
+    """
+    def format_row(self, key, row):
+        """Maps a result row of the given report to its output fields."""
+        if key == 'rooms_with_student_count':
+            return {'room_name': row[0], 'student_count': row[1]}
+        elif key == 'min_avg_age_rooms':
+            return {'room_name': row[0], 'average_age': round(row[1], 2)}
+        elif key == 'max_age_diff_rooms':
+            return {'room_name': row[0], 'age_difference_days': round(row[1], 2)}
+        elif key == 'mixed_gender_rooms':
+            return {'room_name': row[0]}
+
+    def write_json_rows(self, out, key, rows):
+        chunk, written = [], 0
+        for row in rows:
+            chunk.append(json.dumps(self.format_row(key, row), indent=4).replace('\n', '\n        '))
+            if len(chunk) == self.chunk_rows:
+                out.write((',' if written else '') + '\n        ' + ',\n        '.join(chunk))
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            out.write((',' if written else '') + '\n        ' + ',\n        '.join(chunk))
+            written += len(chunk)
+        out.write('\n    ]' if written else ']')
+
+    def write_xml(self, data, out):
+        from lxml import etree
+        items = iter(data.items() if isinstance(data, dict) else data)
+        with etree.xmlfile(out, encoding='utf-8') as xf:
+            xf.write_declaration()
+            first = next(items, None)
+            if first is None:
+                xf.write(etree.Element('results'))
+            else:
+                with xf.element('results'):
+                    for key, rows in chain([first], items):
+                        self.write_xml_report(etree, xf, key, rows)
+                    xf.write('\n')
+        out.write(b'\n')
+
+    def write_xml_report(self, etree, xf, key, rows):
+        tag = key.replace('_', '-')
+        xf.write('\n  ')
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            xf.write(etree.Element(tag))
+            return
+        with xf.element(tag):
+            for count, row in enumerate(chain([first], rows), 1):
+                item = etree.Element('item')
+                item.text = '\n      '
+                for field, value in self.format_row(key, row).items():
+                    etree.SubElement(item, field).text = str(value)
+                    item[-1].tail = '\n      '
+                item[-1].tail = '\n    '
+                xf.write('\n    ')
+                xf.write(item)
+                if count % self.chunk_rows == 0:
+                    xf.flush()
+            xf.write('\n  ')
+
+
+def bench_serialize(args):
+    """
+    Compares the table-driven serializer with the previous one (a dict per row, then json.dumps or
+    lxml elements) on `--rows` result rows: time and rows/sec, the peak memory allocated while
+    serializing, which the chunked writers bound, and per 1M rows the blocks allocated per row that
+    outlive it (count_blocks).
+    lxml allocates through libxml2, so neither figure includes its own buffers.
+    """
+    rows = [(f'Room #{i}', 18 + (i % 1000) / 37) for i in range(args.rows)]
+    candidates = {'json': DataSerializer().write_json, 'xml': DataSerializer().write_xml,
+                  'previous json': PreviousSerializer().write_json}
+    try:
+        import lxml  # noqa: F401
+        candidates['previous xml'] = PreviousSerializer().write_xml
+    except ImportError:
+        print("lxml is not installed, skipping the previous XML writer")
+    per_million = 10**6 / args.rows
+    for name, serialize in candidates.items():
+        start = time.perf_counter()
+        serialize({'min_avg_age_rooms': rows}, NullWriter())
+        elapsed = time.perf_counter() - start
+        counts = {'blocks': 0}
+        serialize({'min_avg_age_rooms': count_blocks(rows, counts)}, NullWriter())
+        tracemalloc.start()
+        serialize({'min_avg_age_rooms': rows}, NullWriter())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:>13}: {args.rows} rows in {elapsed:.2f}s, {args.rows / elapsed:,.0f} rows/sec, "
+              f"peak {peak / 2**20:.1f} MB, {counts['blocks'] * per_million:,.0f} blocks "
+              f"allocated per 1M rows")
+
+
+def import_times(module):
+    """
+    Imports `module` in a fresh interpreter with -X importtime and returns (name, depth, self us,
+    cumulative us) for every module it loaded, in import order.
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True, check=True, cwd=HERE)
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def bench_startup(args):
+    """
+    Measures how long `import process_data` and a full CLI run on the shipped files take in a fresh
+    interpreter, and fails if a heavy optional dependency is imported at startup or the import
+    time exceeds --max-import-ms.
+    """
+    runs = [import_times('process_data') for _ in range(args.repeat)]
+    import_ms = median(modules[-1][3] for modules in runs) / 1000
+    print(f"import process_data: {import_ms:.1f} ms median over {args.repeat} runs")
+    # -X importtime lists a module's imports just before the module itself
+    subtree = []
+    for module in reversed(runs[-1][:-1]):
+        if module[1] == 0:
+            break
+        subtree.append(module)
+    direct = sorted((m for m in subtree if m[1] == 1), key=lambda m: m[3], reverse=True)
+    for name, _, _, cumulative_us in direct[:args.top]:
+        print(f"  {name:<28}{cumulative_us / 1000:>8.1f} ms")
+
+    cli = [sys.executable, os.path.join(HERE, 'process_data.py'), '--students', STUDENTS_FILE,
+           '--rooms', ROOMS_FILE, '--output', os.devnull]
+    for output_format in ('json', 'xml'):
+        walls = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run([*cli, '--format', output_format], check=True, capture_output=True)
+            walls.append(time.perf_counter() - start)
+        print(f"CLI run --format {output_format}: {median(walls) * 1000:.1f} ms median wall time")
+
+    failures = []
+    loaded = {name.split('.')[0] for name, _, _, _ in subtree}
+    for module in args.forbid:
+        if module in loaded:
+            failures.append(f"{module} is imported at startup")
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"import time {import_ms:.1f} ms exceeds {args.max_import_ms} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the student/room data pipeline.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help='Rows/sec and peak memory of students ingestion')
+    ingest.add_argument('--scale', type=int, default=1000, help='How many times to repeat the shipped students file')
+    ingest.add_argument('--modes', nargs='+', choices=['stream', 'json.load'], default=['stream', 'json.load'])
+    ingest.add_argument('--tmpdir', help='Directory for the generated input and database files')
+    ingest.set_defaults(func=bench_ingest)
+
+    bulk = subparsers.add_parser('bulk', help='Load + index time of bulk loading vs. row-by-row index maintenance')
+    bulk.add_argument('--sizes', nargs='+', type=parse_count, default=[10**4, 10**6, 10**7],
+                      help='Student counts to benchmark, e.g. 10k 1M 10M')
+    bulk.add_argument('--tmpdir', help='Directory for the generated input and database files')
+    bulk.set_defaults(func=bench_bulk)
+
+    queries = subparsers.add_parser('queries', help='Report execution time of each QueryExecutor strategy')
+    queries.add_argument('--sizes', nargs='+', type=parse_count, default=[10**4, 10**5, 10**6],
+                         help='Student counts to benchmark, e.g. 10k 100k 1M')
+    queries.add_argument('--repeat', type=int, default=5, help='Runs per strategy; the median is reported')
+    queries.add_argument('--tmpdir', help='Directory for the generated input files')
+    queries.set_defaults(func=bench_queries)
+
+    engines = subparsers.add_parser('engines', help='SQLite vs. columnar engine execution time')
+    engines.add_argument('--sizes', nargs='+', type=parse_count, default=[10**4, 10**5, 10**6],
+                         help='Student counts to benchmark, e.g. 10k 100k 1M')
+    engines.add_argument('--repeat', type=int, default=5, help='Runs per engine; the median is reported')
+    engines.add_argument('--tmpdir', help='Directory for the generated input files')
+    engines.set_defaults(func=bench_engines)
+
+    shards = subparsers.add_parser('shards', help='Sharded ingestion throughput by process pool size')
+    shards.add_argument('--students', type=parse_count, default=10**6, help='Total students, e.g. 1M')
+    shards.add_argument('--shards', type=int, default=100, help='Number of shard files to split them into')
+    shards.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4, 8], help='Pool sizes to benchmark')
+    shards.add_argument('--tmpdir', help='Directory for the generated shard files')
+    shards.set_defaults(func=bench_shards)
+
+    startup = subparsers.add_parser('startup', help='Import time and CLI startup cost of process_data.py')
+    startup.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per measurement; the median is reported')
+    startup.add_argument('--top', type=int, default=10, help='Number of heaviest direct imports to list')
+    startup.add_argument('--forbid', nargs='*', default=['pandas', 'numpy', 'lxml'],
+                         help='Modules that must not be imported at startup')
+    startup.add_argument('--max-import-ms', type=float, help='Fail if importing process_data takes longer')
+    startup.set_defaults(func=bench_startup)
+
+    serialize = subparsers.add_parser('serialize', help='Serializer throughput and allocations vs. the previous serializer')
+    serialize.add_argument('--rows', type=parse_count, default=10**6, help='Result rows to serialize, e.g. 1M')
+    serialize.set_defaults(func=bench_serialize)
+
+    worker = subparsers.add_parser('_ingest-worker')
+    worker.add_argument('mode')
+    worker.add_argument('students_file')
+    worker.add_argument('db_path')
+    worker.set_defaults(func=lambda a: ingest_worker(a.mode, a.students_file, a.db_path))
+
+    args = parser.parse_args()
+    args.func(args)
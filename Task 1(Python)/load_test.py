@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import time
+from statistics import quantiles
+
+
+async def client(host, port, unix_socket, paths, deadline, latencies, errors):
+    """Sends requests over one keep-alive connection until `deadline`, recording each latency."""
+    if unix_socket:
+        reader, writer = await asyncio.open_unix_connection(unix_socket)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        request = 0
+        while time.perf_counter() < deadline:
+            path = paths[request % len(paths)]
+            request += 1
+            start = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+            await writer.drain()
+            status = (await reader.readline()).split()[1]
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if status != b'200':
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(args):
+    """Runs the concurrent clients and prints throughput and latency percentiles."""
+    paths = [f"/reports?format={output_format}" for output_format in args.formats]
+    if args.report:
+        paths = [f"{path}&report={args.report}" for path in paths]
+    if args.no_cache:
+        paths = [f"{path}&cache=off" for path in paths]
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args.host, args.port, args.unix_socket, paths, deadline, latencies, errors)
+                           for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    if len(latencies) < 2:
+        print("Not enough requests completed to compute percentiles.")
+        return
+    percentiles = quantiles(latencies, n=100, method='inclusive')
+    print(f"{len(latencies)} requests from {args.concurrency} clients in {elapsed:.1f}s "
+          f"({len(latencies) / elapsed:,.0f} req/s), {len(errors)} errors")
+    print(f"latency p50 {percentiles[49] * 1000:.2f} ms, p99 {percentiles[98] * 1000:.2f} ms, "
+          f"max {max(latencies) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test for report_server.py.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-socket', help='Connect to this Unix socket instead of a TCP port')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of concurrent keep-alive clients')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run')
+    parser.add_argument('--formats', nargs='+', choices=['json', 'xml'], default=['json', 'xml'],
+                        help='Formats to request, in rotation')
+    parser.add_argument('--report', help='Request a single report instead of all four')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Have every request bypass the report cache, so latencies measure the queries '
+                             'on the connection pool rather than cache hits')
+    asyncio.run(run(parser.parse_args()))
@@ -1,201 +1,1293 @@
-import sqlite3
-import pandas as pd
-import json
-import argparse
-from datetime import date
-from lxml import etree as ET
-
-class DatabaseManager:
-    """A class to manage database connections and operations."""
-    def __init__(self, db_name=':memory:'):
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
-
-    def create_schema(self):
-        """Creates the rooms and students tables with a foreign key constraint."""
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS rooms (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS students (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                birthday DATE,
-                sex TEXT NOT NULL,
-                room_id INTEGER,
-                FOREIGN KEY (room_id) REFERENCES rooms(id)
-            )
-        ''')
-        self.conn.commit()
-
-    def execute_query(self, query, params=None):
-        """Executes a SQL query and returns the results."""
-        if params:
-            self.cursor.execute(query, params)
-        else:
-            self.cursor.execute(query)
-        return self.cursor.fetchall()
-
-    def close(self):
-        """Closes the database connection."""
-        self.conn.close()
-
-class DataLoader:
-    """Handles loading data from JSON files into the database."""
-    def __init__(self, db_manager):
-        self.db_manager = db_manager
-
-    def load_data(self, students_file, rooms_file):
-        """Loads rooms and students data from JSON files and inserts into the database."""
-        try:
-            with open(rooms_file, 'r') as f:
-                rooms_data = json.load(f)
-            self.db_manager.cursor.executemany(
-                'INSERT INTO rooms (id, name) VALUES (?, ?)',
-                [(room['id'], room['name']) for room in rooms_data]
-            )
-
-            with open(students_file, 'r') as f:
-                students_data = json.load(f)
-            self.db_manager.cursor.executemany(
-                'INSERT INTO students (id, name, birthday, sex, room_id) VALUES (?, ?, ?, ?, ?)',
-                [(s['id'], s['name'], s['birthday'].split('T')[0], s['sex'], s['room']) for s in students_data]
-            )
-
-            self.db_manager.conn.commit()
-            print("Data loaded successfully.")
-        except Exception as e:
-            print(f"Error loading data: {e}")
-            self.db_manager.conn.rollback()
-
-class QueryExecutor:
-    """Executes the required analytical queries and returns formatted results."""
-    def __init__(self, db_manager):
-        self.db_manager = db_manager
-
-    def get_query_results(self):
-        """
-        Executes all required analytical queries and returns a dictionary of results.
-        All "mathematics" are performed at the database level using SQLite functions.
-        """
-        results = {}
-
-        # 1. List of rooms and number of students
-        room_student_count_query = """
-            SELECT r.name, COUNT(s.id) as student_count
-            FROM rooms r
-            LEFT JOIN students s ON r.id = s.room_id
-            GROUP BY r.name;
-        """
-        results['rooms_with_student_count'] = self.db_manager.execute_query(room_student_count_query)
-
-        # 2. 5 rooms with the smallest average student age
-        min_avg_age_query = """
-            SELECT r.name, AVG(CAST(strftime('%Y', 'now') - strftime('%Y', s.birthday) AS INTEGER)) as avg_age
-            FROM rooms r
-            JOIN students s ON r.id = s.room_id
-            GROUP BY r.name
-            ORDER BY avg_age ASC
-            LIMIT 5;
-        """
-        results['min_avg_age_rooms'] = self.db_manager.execute_query(min_avg_age_query)
-
-        # 3. 5 rooms with the largest age difference
-        max_age_diff_query = """
-            SELECT r.name, MAX(julianday('now') - julianday(s.birthday)) as age_diff_days
-            FROM rooms r
-            JOIN students s ON r.id = s.room_id
-            GROUP BY r.name
-            ORDER BY age_diff_days DESC
-            LIMIT 5;
-        """
-        results['max_age_diff_rooms'] = self.db_manager.execute_query(max_age_diff_query)
-
-        # 4. Rooms with mixed-gender students
-        mixed_gender_rooms_query = """
-            SELECT r.name, COUNT(DISTINCT s.sex) as unique_sex_count
-            FROM rooms r
-            JOIN students s ON r.id = s.room_id
-            GROUP BY r.name
-            HAVING unique_sex_count > 1;
-        """
-        results['mixed_gender_rooms'] = self.db_manager.execute_query(mixed_gender_rooms_query)
-
-        return results
-
-class DataSerializer:
-    """Handles serialization of query results to JSON or XML."""
-    def to_json(self, data):
-        """Converts data to JSON format."""
-        formatted_results = {}
-        for key, rows in data.items():
-            if key == 'rooms_with_student_count':
-                formatted_results[key] = [{'room_name': row[0], 'student_count': row[1]} for row in rows]
-            elif key == 'min_avg_age_rooms':
-                formatted_results[key] = [{'room_name': row[0], 'average_age': round(row[1], 2)} for row in rows]
-            elif key == 'max_age_diff_rooms':
-                formatted_results[key] = [{'room_name': row[0], 'age_difference_days': round(row[1], 2)} for row in rows]
-            elif key == 'mixed_gender_rooms':
-                formatted_results[key] = [{'room_name': row[0]} for row in rows]
-        return json.dumps(formatted_results, indent=4)
-
-    def to_xml(self, data):
-        """Converts data to XML format."""
-        root = ET.Element('results')
-        for key, rows in data.items():
-            query_element = ET.SubElement(root, key.replace('_', '-'))
-            for row in rows:
-                item = ET.SubElement(query_element, 'item')
-                if key == 'rooms_with_student_count':
-                    ET.SubElement(item, 'room_name').text = str(row[0])
-                    ET.SubElement(item, 'student_count').text = str(row[1])
-                elif key == 'min_avg_age_rooms':
-                    ET.SubElement(item, 'room_name').text = str(row[0])
-                    ET.SubElement(item, 'average_age').text = str(round(row[1], 2))
-                elif key == 'max_age_diff_rooms':
-                    ET.SubElement(item, 'room_name').text = str(row[0])
-                    ET.SubElement(item, 'age_difference_days').text = str(round(row[1], 2))
-                elif key == 'mixed_gender_rooms':
-                    ET.SubElement(item, 'room_name').text = str(row[0])
-        return ET.tostring(root, pretty_print=True, xml_declaration=True, encoding='utf-8')
-
-# The main function to tie everything together and create a CLI
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Load student data into a database and run queries.")
-    parser.add_argument('--students', required=True, help='Path to the students JSON file')
-    parser.add_argument('--rooms', required=True, help='Path to the rooms JSON file')
-    parser.add_argument('--format', choices=['json', 'xml'], required=True, help='Output format: json or xml')
-    args = parser.parse_args()
-
-    # Create an in-memory SQLite database for demonstration
-    db_manager = DatabaseManager()
-    data_loader = DataLoader(db_manager)
-    query_executor = QueryExecutor(db_manager)
-    serializer = DataSerializer()
-
-    try:
-        db_manager.create_schema()
-        data_loader.load_data(args.students, args.rooms)
-        
-        # Add indexes for query optimization
-        db_manager.cursor.execute("CREATE INDEX idx_students_room_id ON students(room_id);")
-        db_manager.cursor.execute("CREATE INDEX idx_students_birthday ON students(birthday);")
-        db_manager.cursor.execute("CREATE INDEX idx_students_sex ON students(sex);")
-        db_manager.conn.commit()
-        print("Indexes created for optimization.")
-
-        results = query_executor.get_query_results()
-
-        if args.format == 'json':
-            output = serializer.to_json(results)
-        else:
-            output = serializer.to_xml(results).decode('utf-8')
-
-        print("\nQuery Results:")
-        print(output)
-
-    finally:
+import sqlite3
+import io
+import json
+import sys
+import threading
+import argparse
+import glob
+import hashlib
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import date
+from itertools import chain, islice
+from operator import itemgetter
+
+# A decode error this close to the end of the buffer may be a token split across reads, such as
+# "-Infinity" or a \uXXXX escape, rather than malformed input
+MAX_TOKEN_CHARS = 16
+
+def iter_json_array(path, read_size=1 << 16):
+    """
+    Yields the elements of a top-level JSON array one at a time without loading the whole file.
+    Malformed input raises ValueError with the character offset of the error in the file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buf, pos, eof = '', 0, False
+        # Characters dropped from the front of buf so far, to report offsets relative to the file
+        consumed = 0
+
+        def fill(buf, pos):
+            """Drops consumed text and appends the next chunk; returns the new buffer and EOF flag."""
+            nonlocal consumed
+            consumed += pos
+            chunk = f.read(read_size)
+            return buf[pos:] + chunk, not chunk
+
+        def skip_ws(buf, pos, eof):
+            """Advances past whitespace, reading more input until a token is available or EOF."""
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return buf, pos, eof
+                buf, eof = fill(buf, pos)
+                pos = 0
+
+        buf, pos, eof = skip_ws(buf, pos, eof)
+        if pos >= len(buf) or buf[pos] != '[':
+            raise ValueError(f"{path}: expected a top-level JSON array")
+        def expect_end(buf, pos, eof):
+            """Checks that nothing but whitespace follows the closing bracket at `pos`."""
+            buf, pos, eof = skip_ws(buf, pos + 1, eof)
+            if pos < len(buf):
+                raise ValueError(f"{path}: unexpected data after the JSON array at character {consumed + pos}")
+
+        buf, pos, eof = skip_ws(buf, pos + 1, eof)
+        if pos < len(buf) and buf[pos] == ']':
+            expect_end(buf, pos, eof)
+            return
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                # More input only helps when the element is cut off by the end of the buffer: the error
+                # is within a token's length of the end (e.g. a split \uXXXX escape or literal), or in a
+                # string still open there. Anything else is malformed and reported without reading on.
+                truncated = len(buf) - e.pos <= MAX_TOKEN_CHARS or e.msg.startswith('Unterminated string')
+                if eof or not truncated:
+                    # Some messages already end in "at", such as "Unterminated string starting at"
+                    raise ValueError(f"{path}: {e.msg.removesuffix(' at')} at character {consumed + e.pos}") from None
+                buf, eof = fill(buf, pos)
+                pos = 0
+                continue
+            number = isinstance(item, (int, float)) and not isinstance(item, bool)
+            if not eof and (end == len(buf) or number and len(buf) - end <= MAX_TOKEN_CHARS):
+                # A number or literal may continue in the next chunk, including a number cut just after
+                # its "." or "e", which decodes as its leading digits; decode it again with more input.
+                buf, eof = fill(buf, pos)
+                pos = 0
+                continue
+            yield item
+
+            buf, pos, eof = skip_ws(buf, end, eof)
+            if pos >= len(buf):
+                raise ValueError(f"{path}: unterminated JSON array")
+            if buf[pos] == ']':
+                expect_end(buf, pos, eof)
+                return
+            if buf[pos] != ',':
+                raise ValueError(f"{path}: expected ',' or ']' at character {consumed + pos}")
+            buf, pos, eof = skip_ws(buf, pos + 1, eof)
+
+def batched(iterable, size):
+    """Groups an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def file_fingerprint(path):
+    """Returns a cheap (size, mtime) fingerprint used to skip unchanged input files."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def file_checksum(path, read_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(read_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Bumped whenever the table layout changes; older databases are rebuilt from the source files.
+SCHEMA_VERSION = 5
+
+# Birthdays are stored as day numbers (date.toordinal()), with their calendar year alongside so the
+# age reports need no date functions per row. Adding this offset to a day number gives the Julian day
+# of the date's midnight, which is what julianday() returned for the ISO date strings stored before.
+JULIAN_DAY_OFFSET = 1721424.5
+
+class DatabaseManager:
+    """A class to manage database connections and operations."""
+    SECONDARY_INDEXES = (
+        ('idx_students_room_id', 'students(room_id)'),
+        ('idx_students_birthday', 'students(birthday)'),
+        ('idx_students_sex', 'students(sex)'),
+        ('idx_students_source_id', 'students(source_id)'),
+    )
+
+    # Statements that add or remove one student ({row} is NEW or OLD) from the room statistics.
+    ROOM_STATS_ADD = '''
+        INSERT INTO room_stats (room_id, student_count, birthday_count, birth_year_sum, min_birthday, max_birthday)
+        SELECT {row}.room_id, 1, {row}.birthday IS NOT NULL,
+               COALESCE({row}.birth_year, 0), {row}.birthday, {row}.birthday
+        WHERE {row}.room_id IS NOT NULL
+        ON CONFLICT(room_id) DO UPDATE SET
+            student_count = student_count + 1,
+            birthday_count = birthday_count + excluded.birthday_count,
+            birth_year_sum = birth_year_sum + excluded.birth_year_sum,
+            min_birthday = CASE WHEN min_birthday IS NULL OR excluded.min_birthday < min_birthday
+                                THEN excluded.min_birthday ELSE min_birthday END,
+            max_birthday = CASE WHEN max_birthday IS NULL OR excluded.max_birthday > max_birthday
+                                THEN excluded.max_birthday ELSE max_birthday END;
+        INSERT INTO room_sex_stats (room_id, sex, student_count)
+        SELECT {row}.room_id, {row}.sex, 1
+        WHERE {row}.room_id IS NOT NULL
+        ON CONFLICT(room_id, sex) DO UPDATE SET student_count = student_count + 1;
+    '''
+    ROOM_STATS_REMOVE = '''
+        UPDATE room_stats SET
+            student_count = student_count - 1,
+            birthday_count = birthday_count - ({row}.birthday IS NOT NULL),
+            birth_year_sum = birth_year_sum - COALESCE({row}.birth_year, 0),
+            min_birthday = CASE WHEN {row}.birthday = min_birthday
+                                THEN (SELECT MIN(birthday) FROM students WHERE room_id = {row}.room_id)
+                                ELSE min_birthday END,
+            max_birthday = CASE WHEN {row}.birthday = max_birthday
+                                THEN (SELECT MAX(birthday) FROM students WHERE room_id = {row}.room_id)
+                                ELSE max_birthday END
+        WHERE room_id = {row}.room_id;
+        DELETE FROM room_stats WHERE room_id = {row}.room_id AND student_count = 0;
+        UPDATE room_sex_stats SET student_count = student_count - 1
+        WHERE room_id = {row}.room_id AND sex = {row}.sex;
+        DELETE FROM room_sex_stats WHERE room_id = {row}.room_id AND sex = {row}.sex AND student_count = 0;
+    '''
+
+    def __init__(self, db_name=':memory:', read_only=False):
+        if read_only:
+            # Read-only connections may be handed between threads by a connection pool
+            self.conn = sqlite3.connect(f'file:{db_name}?mode=ro', uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(db_name)
+        self.cursor = self.conn.cursor()
+        # Set while bulk_mode holds the whole load in one transaction
+        self.in_bulk_load = False
+        if db_name != ':memory:' and not read_only:
+            self.configure_persistent()
+
+    def configure_persistent(self):
+        """Tunes a file-backed database for fast reloads and concurrent readers."""
+        self.cursor.execute('PRAGMA journal_mode = WAL')
+        self.cursor.execute('PRAGMA synchronous = NORMAL')
+        self.cursor.execute('PRAGMA temp_store = MEMORY')
+        self.cursor.execute('PRAGMA cache_size = -65536')
+        self.cursor.execute('PRAGMA mmap_size = 268435456')
+
+    def create_schema(self):
+        """Creates the rooms and students tables with a foreign key constraint."""
+        if self.execute_query('PRAGMA user_version')[0][0] != SCHEMA_VERSION:
+            for table in ('students', 'rooms', 'source_files', 'metadata', 'room_stats', 'room_sex_stats'):
+                self.cursor.execute(f'DROP TABLE IF EXISTS {table}')
+            self.cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rooms (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                source_id INTEGER
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS students (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                birthday INTEGER,
+                birth_year INTEGER,
+                sex TEXT NOT NULL,
+                room_id INTEGER,
+                source_id INTEGER,
+                FOREIGN KEY (room_id) REFERENCES rooms(id)
+            )
+        ''')
+        # Every row records the input file it was last loaded from (source_id), so a reload can
+        # delete the rows a changed file no longer contains and the rows of files no longer given.
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS source_files (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS metadata (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+        # Per-room aggregates kept in step with students by triggers, so reports read O(rooms) rows.
+        # Per-sex counts live in a companion table since the set of sex values is open.
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS room_stats (
+                room_id INTEGER PRIMARY KEY,
+                student_count INTEGER NOT NULL,
+                birthday_count INTEGER NOT NULL,
+                birth_year_sum INTEGER NOT NULL,
+                min_birthday INTEGER,
+                max_birthday INTEGER
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS room_sex_stats (
+                room_id INTEGER NOT NULL,
+                sex TEXT NOT NULL,
+                student_count INTEGER NOT NULL,
+                PRIMARY KEY (room_id, sex)
+            ) WITHOUT ROWID
+        ''')
+        self.create_triggers()
+        self.commit()
+
+    def create_triggers(self):
+        """Creates the triggers that maintain room_stats and room_sex_stats as students change."""
+        add_new = self.ROOM_STATS_ADD.format(row='NEW')
+        remove_old = self.ROOM_STATS_REMOVE.format(row='OLD')
+        self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS students_stats_insert AFTER INSERT ON students "
+                            f"BEGIN {add_new} END;")
+        self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS students_stats_delete AFTER DELETE ON students "
+                            f"BEGIN {remove_old} END;")
+        self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS students_stats_update "
+                            f"AFTER UPDATE OF birthday, birth_year, sex, room_id ON students "
+                            f"BEGIN {remove_old} {add_new} END;")
+
+    def drop_triggers(self):
+        """Drops the room statistics triggers so a bulk load does not fire them row by row."""
+        for name in ('students_stats_insert', 'students_stats_delete', 'students_stats_update'):
+            self.cursor.execute(f"DROP TRIGGER IF EXISTS {name};")
+
+    def refresh_room_stats(self):
+        """Rebuilds room_stats and room_sex_stats from scratch in one pass over students."""
+        self.cursor.execute("DELETE FROM room_stats")
+        self.cursor.execute("DELETE FROM room_sex_stats")
+        self.cursor.execute('''
+            INSERT INTO room_stats (room_id, student_count, birthday_count, birth_year_sum, min_birthday, max_birthday)
+            SELECT room_id, COUNT(*), COUNT(birthday), COALESCE(SUM(birth_year), 0),
+                   MIN(birthday), MAX(birthday)
+            FROM students
+            WHERE room_id IS NOT NULL
+            GROUP BY room_id
+        ''')
+        self.cursor.execute('''
+            INSERT INTO room_sex_stats (room_id, sex, student_count)
+            SELECT room_id, sex, COUNT(*)
+            FROM students
+            WHERE room_id IS NOT NULL
+            GROUP BY room_id, sex
+        ''')
+
+    def create_indexes(self):
+        """Creates the secondary indexes used by the analytical queries and by incremental reloads."""
+        for name, columns in self.SECONDARY_INDEXES:
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns};")
+        self.commit()
+
+    def drop_indexes(self):
+        """Drops the secondary indexes so a bulk load does not maintain them row by row."""
+        for name, _ in self.SECONDARY_INDEXES:
+            self.cursor.execute(f"DROP INDEX IF EXISTS {name};")
+        self.commit()
+
+    def data_version(self):
+        """Returns the stamp DataLoader sets whenever a load changes the data ('' before the first load)."""
+        rows = self.execute_query("SELECT value FROM metadata WHERE key = 'data_version'")
+        return rows[0][0] if rows else ''
+
+    def is_empty(self):
+        """Returns True if no students have been loaded yet."""
+        return not self.execute_query('SELECT EXISTS (SELECT 1 FROM students)')[0][0]
+
+    @contextmanager
+    def bulk_mode(self):
+        """
+        Turns off synchronous writes and the rollback journal for the duration of a bulk load, and
+        holds everything done inside the block in one transaction: commit() does nothing until the
+        block ends. Without a journal that transaction cannot be rolled back; if the block raises,
+        what was written so far is committed, so rerun the load into a fresh database.
+        """
+        self.conn.commit()
+        journal_mode = self.execute_query('PRAGMA journal_mode')[0][0]
+        synchronous = self.execute_query('PRAGMA synchronous')[0][0]
+        self.cursor.execute('PRAGMA synchronous = OFF')
+        self.cursor.execute('PRAGMA journal_mode = OFF')
+        self.cursor.execute('BEGIN')
+        self.in_bulk_load = True
+        try:
+            yield
+        finally:
+            self.in_bulk_load = False
+            self.conn.commit()
+            self.cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+            self.cursor.execute(f'PRAGMA synchronous = {synchronous}')
+
+    def commit(self):
+        """Commits the current transaction, unless bulk_mode is holding it open until the load ends."""
+        if not self.in_bulk_load:
+            self.conn.commit()
+
+    def execute_query(self, query, params=None):
+        """Executes a SQL query and returns the results."""
+        if params:
+            self.cursor.execute(query, params)
+        else:
+            self.cursor.execute(query)
+        return self.cursor.fetchall()
+
+    def close(self):
+        """Closes the database connection."""
+        self.conn.close()
+
+# Outcome of loading one input file: status is 'loaded', 'unchanged', 'failed' or 'removed' (a file
+# loaded before that is no longer an input, whose rows were deleted).
+LoadResult = namedtuple('LoadResult', 'path status rows changed seconds error')
+
+class DataLoader:
+    """Handles loading data from JSON files into the database."""
+    # Upsert statements by table; each row is followed by the id of the source file it comes from
+    UPSERTS = {
+        'rooms': '''
+            INSERT INTO rooms (id, name, source_id) VALUES (?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET name = excluded.name, source_id = excluded.source_id
+            WHERE (name, source_id) IS NOT (excluded.name, excluded.source_id)
+        ''',
+        'students': '''
+            INSERT INTO students (id, name, birthday, birth_year, sex, room_id, source_id) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                name = excluded.name, birthday = excluded.birthday, birth_year = excluded.birth_year,
+                sex = excluded.sex, room_id = excluded.room_id, source_id = excluded.source_id
+            WHERE (name, birthday, sex, room_id, source_id)
+                IS NOT (excluded.name, excluded.birthday, excluded.sex, excluded.room_id, excluded.source_id)
+        ''',
+    }
+
+    def __init__(self, db_manager, batch_size=10000):
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+
+    @staticmethod
+    def room_row(room):
+        """Converts a room record to an insert tuple."""
+        return room['id'], room['name']
+
+    @staticmethod
+    def student_row(s):
+        """Converts a student record to an insert tuple, with the date part of the birthday as a day number and its year."""
+        birthday = date.fromisoformat(s['birthday'].split('T')[0])
+        return s['id'], s['name'], birthday.toordinal(), birthday.year, s['sex'], s['room']
+
+    def load_data(self, students_files, rooms_file, workers=None):
+        """
+        Loads rooms and students data from JSON files and inserts into the database.
+        `students_files` is a path or a list of shard paths. A single file is parsed one record
+        at a time in this process; several shards are parsed in parallel by a process pool
+        while this process writes their rows as they arrive. Each file is committed on its
+        own, so a bad shard does not undo the others. Files whose checksum matches the previous
+        load are skipped, and only rows whose content changed are written. Rows a changed file no
+        longer contains, and the rows of files loaded before but not given now, are deleted, so
+        the database ends up holding exactly the given inputs.
+        Returns one LoadResult per input file, plus one per removed file.
+        """
+        if isinstance(students_files, str):
+            students_files = [students_files]
+        results = [self.load_file(rooms_file, 'rooms', self.room_row)]
+        if len(students_files) == 1:
+            results.append(self.load_file(students_files[0], 'students', self.student_row))
+        else:
+            results.extend(self.load_shards(students_files, workers))
+        results.extend(self.remove_sources([rooms_file, *students_files]))
+        if any(result.changed for result in results):
+            self.bump_data_version()
+        return results
+
+    def bump_data_version(self):
+        """
+        Stamps the data with a digest of every source file loaded so far. The same inputs always
+        produce the same stamp, so cached reports stay valid across restarts and fresh databases.
+        """
+        digest = hashlib.sha256()
+        for path, checksum in self.db_manager.execute_query('SELECT path, sha256 FROM source_files ORDER BY path'):
+            digest.update(f"{path}\0{checksum}\n".encode('utf-8'))
+        self.db_manager.cursor.execute('''
+            INSERT INTO metadata (key, value) VALUES ('data_version', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', (digest.hexdigest(),))
+        self.db_manager.commit()
+
+    def bulk_load(self, students_files, rooms_file, workers=None):
+        """
+        Fast path for loading into an empty database: durability is relaxed, and the whole load,
+        the index builds and ANALYZE run in one transaction (see DatabaseManager.bulk_mode). Rows
+        go in without per-row index maintenance, sorted by primary key within each batch of
+        `batch_size` rows (the input is streamed, so not across batches), and the secondary
+        indexes are built once at the end followed by ANALYZE so the query planner has fresh
+        statistics. The room statistics triggers are likewise suspended and the statistics
+        rebuilt in one pass. A file that fails has its rows deleted (discard_file).
+        """
+        with self.db_manager.bulk_mode():
+            self.db_manager.drop_indexes()
+            self.db_manager.drop_triggers()
+            results = self.load_data(students_files, rooms_file, workers)
+            self.db_manager.refresh_room_stats()
+            self.db_manager.create_triggers()
+            self.db_manager.create_indexes()
+            self.db_manager.cursor.execute('ANALYZE')
+        return results
+
+    def load_file(self, path, table, to_row):
+        """Streams the records of one JSON file into the database unless it is unchanged since the last load."""
+        start = time.perf_counter()
+        try:
+            source = self.changed_source(path)
+            if source is None:
+                return LoadResult(path, 'unchanged', 0, 0, time.perf_counter() - start, None)
+            rows, changed = self.replace_rows(table, path, source, map(to_row, iter_json_array(path)))
+            self.db_manager.commit()
+            return LoadResult(path, 'loaded', rows, changed, time.perf_counter() - start, None)
+        except Exception as e:
+            self.discard_file(path, table)
+            return LoadResult(path, 'failed', 0, 0, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+
+    def load_shards(self, paths, workers=None):
+        """
+        Parses student shards in a process pool and upserts each shard's rows as soon as it
+        arrives. At most two shards per worker are in flight, which bounds memory use.
+        """
+        # Imported here: loading a single file does not need the multiprocessing machinery
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        results = []
+        pending = {}
+        for path in paths:
+            start = time.perf_counter()
+            try:
+                source = self.changed_source(path)
+            except OSError as e:
+                results.append(LoadResult(path, 'failed', 0, 0, time.perf_counter() - start, f"{type(e).__name__}: {e}"))
+                continue
+            if source is None:
+                results.append(LoadResult(path, 'unchanged', 0, 0, time.perf_counter() - start, None))
+            else:
+                pending[path] = source
+
+        workers = workers or os.cpu_count() or 1
+        queue = iter(pending)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = {pool.submit(parse_students_shard, path): path for path in islice(queue, 2 * workers)}
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = in_flight.pop(future)
+                    for next_path in islice(queue, 1):
+                        in_flight[pool.submit(parse_students_shard, next_path)] = next_path
+                    results.append(self.write_shard(path, pending[path], future))
+        return results
+
+    def discard_file(self, path, table):
+        """
+        Undoes the writes of a file that failed to load. Outside a bulk load that is a rollback of
+        its transaction. A bulk load keeps no journal to roll back, but only loads files seen for
+        the first time, so deleting the file's rows and its source record restores the state before it.
+        """
+        if not self.db_manager.in_bulk_load:
+            self.db_manager.conn.rollback()
+            return
+        for (source_id,) in self.db_manager.execute_query('SELECT id FROM source_files WHERE path = ?',
+                                                          (os.path.abspath(path),)):
+            self.db_manager.cursor.execute(f'DELETE FROM {table} WHERE source_id = ?', (source_id,))
+            self.db_manager.cursor.execute('DELETE FROM source_files WHERE id = ?', (source_id,))
+
+    def write_shard(self, path, source, future):
+        """Upserts and commits the rows parsed from one shard, or records why the shard failed."""
+        start = time.perf_counter()
+        try:
+            rows, parse_seconds = future.result()
+            _, changed = self.replace_rows('students', path, source, rows)
+            self.db_manager.commit()
+            return LoadResult(path, 'loaded', len(rows), changed, parse_seconds + time.perf_counter() - start, None)
+        except Exception as e:
+            self.discard_file(path, 'students')
+            return LoadResult(path, 'failed', 0, 0, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+
+    def replace_rows(self, table, path, source, rows):
+        """
+        Upserts the rows of a changed file under its source id, then deletes the rows previously
+        loaded from the file that it no longer contains. Returns (seen, changed): the number of rows
+        in the file, and the number of rows inserted, updated or deleted. The caller commits.
+        """
+        reloaded = self.db_manager.execute_query('SELECT 1 FROM source_files WHERE path = ?', (os.path.abspath(path),))
+        source_id = self.record_source(path, *source)
+        if not reloaded:
+            # A file loaded for the first time has no rows in the database to delete
+            return self.insert_rows(table, rows, source_id)
+        cursor = self.db_manager.cursor
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS loaded_ids (id INTEGER PRIMARY KEY)')
+        seen, changed = self.insert_rows(table, rows, source_id, track_ids=True)
+        cursor.execute(f'DELETE FROM {table} WHERE source_id = ? AND id NOT IN (SELECT id FROM temp.loaded_ids)',
+                       (source_id,))
+        changed += cursor.rowcount
+        cursor.execute('DELETE FROM temp.loaded_ids')
+        return seen, changed
+
+    def insert_rows(self, table, rows, source_id, track_ids=False):
+        """
+        Upserts rows in fixed-size batches and returns (rows seen, rows inserted or changed).
+        With track_ids the ids are also staged in temp.loaded_ids.
+        """
+        seen = changed = 0
+        for batch in batched(rows, self.batch_size):
+            # Inserting in primary-key order keeps b-tree page splits local.
+            batch.sort(key=itemgetter(0))
+            self.db_manager.cursor.executemany(self.UPSERTS[table], [(*row, source_id) for row in batch])
+            # rowcount excludes rows written by triggers and upserts that changed nothing
+            changed += self.db_manager.cursor.rowcount
+            seen += len(batch)
+            if track_ids:
+                self.db_manager.cursor.executemany('INSERT OR IGNORE INTO temp.loaded_ids (id) VALUES (?)',
+                                                   [row[:1] for row in batch])
+        return seen, changed
+
+    def remove_sources(self, paths):
+        """Deletes the rows of every file loaded before that is not among `paths`, one LoadResult each."""
+        keep = {os.path.abspath(path) for path in paths}
+        results = []
+        for source_id, path in self.db_manager.execute_query('SELECT id, path FROM source_files ORDER BY path'):
+            if path in keep:
+                continue
+            start = time.perf_counter()
+            deleted = 0
+            # Students first, since they reference rooms
+            for table in ('students', 'rooms'):
+                self.db_manager.cursor.execute(f'DELETE FROM {table} WHERE source_id = ?', (source_id,))
+                deleted += self.db_manager.cursor.rowcount
+            self.db_manager.cursor.execute('DELETE FROM source_files WHERE id = ?', (source_id,))
+            self.db_manager.commit()
+            results.append(LoadResult(path, 'removed', 0, deleted, time.perf_counter() - start, None))
+        return results
+
+    def changed_source(self, path):
+        """Returns (size, mtime_ns, sha256) of a file that changed since its last load, or None if it did not."""
+        key = os.path.abspath(path)
+        size, mtime_ns = file_fingerprint(path)
+        stored = self.db_manager.execute_query('SELECT size, mtime_ns, sha256 FROM source_files WHERE path = ?', (key,))
+        if stored and stored[0][:2] == (size, mtime_ns):
+            return None
+        checksum = file_checksum(path)
+        if stored and stored[0][2] == checksum:
+            # Touched but not modified: remember the new fingerprint so the next run skips the checksum
+            self.record_source(path, size, mtime_ns, checksum)
+            self.db_manager.commit()
+            return None
+        return size, mtime_ns, checksum
+
+    def record_source(self, path, size, mtime_ns, checksum):
+        """Remembers the fingerprint and checksum a file had when it was loaded; returns its source id."""
+        self.db_manager.cursor.execute('''
+            INSERT INTO source_files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, sha256 = excluded.sha256
+            RETURNING id
+        ''', (os.path.abspath(path), size, mtime_ns, checksum))
+        return self.db_manager.cursor.fetchone()[0]
+
+def parse_students_shard(path):
+    """Process pool worker: parses one students shard into insert tuples and reports how long it took."""
+    start = time.perf_counter()
+    rows = [DataLoader.student_row(s) for s in iter_json_array(path)]
+    return rows, time.perf_counter() - start
+
+def resolve_input_files(spec):
+    """Expands a file path, a directory (all *.json files in it) or a glob pattern to a sorted list of files."""
+    if os.path.isdir(spec):
+        paths = glob.glob(os.path.join(glob.escape(spec), '*.json'))
+    elif os.path.exists(spec):
+        paths = [spec]
+    else:
+        paths = glob.glob(spec)
+    if not paths:
+        raise FileNotFoundError(f"No input files match {spec!r}")
+    return sorted(paths)
+
+class QueryExecutor:
+    """Executes the required analytical queries and returns formatted results."""
+    STRATEGIES = ('per-query', 'single-pass', 'room-stats')
+    REPORTS = ('rooms_with_student_count', 'min_avg_age_rooms', 'max_age_diff_rooms', 'mixed_gender_rooms')
+
+    def __init__(self, db_manager, strategy='per-query'):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy!r}; expected one of {self.STRATEGIES}")
+        self.db_manager = db_manager
+        self.strategy = strategy
+        self.timings = {}
+
+    def get_query_results(self):
+        """
+        Executes all required analytical queries and returns a dictionary of results.
+        All "mathematics" are performed at the database level using SQLite functions.
+        Wall-clock seconds per step are recorded in `self.timings`.
+        """
+        self.timings = {}
+        start = time.perf_counter()
+        results = {key: rows.fetchall() for key, rows in self.iter_query_results()}
+        self.timings['total'] = time.perf_counter() - start
+        return results
+
+    def iter_query_results(self, reports=None):
+        """
+        Yields (report name, rows) pairs with rows streaming straight from a cursor, for every
+        report or only those named in `reports`; the queries of other reports are not run.
+        Each query runs only once the previous report's rows have been consumed.
+        """
+        if self.strategy == 'single-pass':
+            queries = self.run_single_pass(self.now())
+        elif self.strategy == 'room-stats':
+            queries = self.run_room_stats(self.now())
+        else:
+            queries = self.run_per_query(self.now())
+        for name, query, params in queries:
+            if reports is None or name in reports:
+                yield from self.timed_query(name, query, params)
+
+    @staticmethod
+    def now():
+        """
+        Returns the current UTC year and Julian day as query parameters, computed once per run
+        exactly as SQLite computes strftime('%Y', 'now') and julianday('now').
+        """
+        now_ms = time.time_ns() // 1_000_000
+        return {'this_year': time.gmtime(now_ms // 1000).tm_year,
+                'julian_now': (now_ms + 210_866_760_000_000) / 86_400_000}
+
+    def timed_query(self, name, query, params=()):
+        """Yields one (name, cursor) pair and records the time until the caller has consumed its rows."""
+        start = time.perf_counter()
+        yield name, self.db_manager.conn.execute(query, params)
+        self.timings[name] = time.perf_counter() - start
+
+    def run_per_query(self, now):
+        """Yields (report name, query, params) per report; every query scans and joins students to rooms."""
+        # 1. List of rooms and number of students
+        room_student_count_query = """
+            SELECT r.name, COUNT(s.id) as student_count
+            FROM rooms r
+            LEFT JOIN students s ON r.id = s.room_id
+            GROUP BY r.name;
+        """
+        yield 'rooms_with_student_count', room_student_count_query, ()
+
+        # 2. 5 rooms with the smallest average student age
+        min_avg_age_query = """
+            SELECT r.name, AVG(:this_year - s.birth_year) as avg_age
+            FROM rooms r
+            JOIN students s ON r.id = s.room_id
+            GROUP BY r.name
+            ORDER BY avg_age ASC
+            LIMIT 5;
+        """
+        yield 'min_avg_age_rooms', min_avg_age_query, now
+
+        # 3. 5 rooms with the largest age difference
+        max_age_diff_query = f"""
+            SELECT r.name, MAX(:julian_now - (s.birthday + {JULIAN_DAY_OFFSET})) as age_diff_days
+            FROM rooms r
+            JOIN students s ON r.id = s.room_id
+            GROUP BY r.name
+            ORDER BY age_diff_days DESC
+            LIMIT 5;
+        """
+        yield 'max_age_diff_rooms', max_age_diff_query, now
+
+        # 4. Rooms with mixed-gender students
+        mixed_gender_rooms_query = """
+            SELECT r.name, COUNT(DISTINCT s.sex) as unique_sex_count
+            FROM rooms r
+            JOIN students s ON r.id = s.room_id
+            GROUP BY r.name
+            HAVING unique_sex_count > 1;
+        """
+        yield 'mixed_gender_rooms', mixed_gender_rooms_query, ()
+
+    def run_single_pass(self, now):
+        """
+        Computes every aggregate in one scan of students grouped by room and sex, folds that small
+        result into one row per room name (as run_per_query groups by name, rooms sharing a name
+        are reported together), and yields the four report queries over it. The temporary table is
+        dropped once the last report has been consumed. The results are identical to run_per_query.
+        """
+        self.db_manager.cursor.execute("DROP TABLE IF EXISTS temp.room_aggregates")
+        start = time.perf_counter()
+        # AVG over a name is recombined from per-group sums and counts, computed exactly in integers
+        self.db_manager.cursor.execute(f"""
+            CREATE TEMP TABLE room_aggregates AS
+            SELECT r.name,
+                   SUM(a.student_count) as student_count,
+                   CAST(SUM(a.age_sum) AS REAL) / SUM(a.birthday_count) as avg_age,
+                   MAX(a.age_diff_days) as age_diff_days,
+                   COUNT(DISTINCT a.sex) as unique_sex_count
+            FROM rooms r
+            LEFT JOIN (
+                SELECT room_id, sex,
+                       COUNT(id) as student_count,
+                       SUM(:this_year - birth_year) as age_sum,
+                       COUNT(birthday) as birthday_count,
+                       MAX(:julian_now - (birthday + {JULIAN_DAY_OFFSET})) as age_diff_days
+                FROM students
+                GROUP BY room_id, sex
+            ) a ON r.id = a.room_id
+            GROUP BY r.name
+            ORDER BY r.name;
+        """, now)
+        self.timings['room_aggregates'] = time.perf_counter() - start
+
+        yield ('rooms_with_student_count', """
+            SELECT name, COALESCE(student_count, 0) FROM room_aggregates ORDER BY name;
+        """, ())
+        yield ('min_avg_age_rooms', """
+            SELECT name, avg_age FROM room_aggregates
+            WHERE student_count IS NOT NULL
+            ORDER BY avg_age ASC
+            LIMIT 5;
+        """, ())
+        yield ('max_age_diff_rooms', """
+            SELECT name, age_diff_days FROM room_aggregates
+            WHERE student_count IS NOT NULL
+            ORDER BY age_diff_days DESC
+            LIMIT 5;
+        """, ())
+        yield ('mixed_gender_rooms', """
+            SELECT name, unique_sex_count FROM room_aggregates
+            WHERE unique_sex_count > 1
+            ORDER BY name;
+        """, ())
+        self.db_manager.cursor.execute("DROP TABLE temp.room_aggregates")
+
+    def run_room_stats(self, now):
+        """
+        Yields the four report queries over the trigger-maintained room_stats and room_sex_stats
+        tables, which read one row per room (or per room and sex) instead of every student.
+        The results are identical to run_per_query.
+        """
+        yield ('rooms_with_student_count', """
+            SELECT r.name, COALESCE(SUM(st.student_count), 0) as student_count
+            FROM rooms r
+            LEFT JOIN room_stats st ON r.id = st.room_id
+            GROUP BY r.name;
+        """, ())
+        # AVG(now_year - birth_year) == (now_year * n - SUM(birth_year)) / n, computed exactly in integers
+        yield ('min_avg_age_rooms', """
+            SELECT r.name,
+                   CAST(SUM(:this_year * st.birthday_count - st.birth_year_sum) AS REAL)
+                       / SUM(st.birthday_count) as avg_age
+            FROM rooms r
+            JOIN room_stats st ON r.id = st.room_id
+            GROUP BY r.name
+            ORDER BY avg_age ASC
+            LIMIT 5;
+        """, now)
+        yield ('max_age_diff_rooms', f"""
+            SELECT r.name, :julian_now - (MIN(st.min_birthday) + {JULIAN_DAY_OFFSET}) as age_diff_days
+            FROM rooms r
+            JOIN room_stats st ON r.id = st.room_id
+            GROUP BY r.name
+            ORDER BY age_diff_days DESC
+            LIMIT 5;
+        """, now)
+        yield ('mixed_gender_rooms', """
+            SELECT r.name, COUNT(DISTINCT ss.sex) as unique_sex_count
+            FROM rooms r
+            JOIN room_sex_stats ss ON r.id = ss.room_id
+            GROUP BY r.name
+            HAVING unique_sex_count > 1;
+        """, ())
+
+class ColumnarQueryExecutor:
+    """
+    Alternative engine that loads students and rooms into columnar pandas/NumPy arrays and
+    computes the same reports as QueryExecutor with vectorized group-by operations. pandas and
+    NumPy are imported on first use, so the SQLite path never pays for them.
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.timings = {}
+
+    def load_frames(self):
+        """
+        Reads the tables into typed columns: int32 room ids, datetime64 birthdays, float birth years
+        (NaN when missing) and categorical sex.
+        Students without a room appear in no report, so they are left out.
+        """
+        import numpy as np
+        import pandas as pd
+        rows = self.db_manager.execute_query(
+            'SELECT room_id, birthday, birth_year, sex FROM students WHERE room_id IS NOT NULL')
+        room_id, birthday, birth_year, sex = zip(*rows) if rows else ((), (), (), ())
+        students = pd.DataFrame({
+            'room_id': np.asarray(room_id, dtype=np.int32),
+            # Day numbers to datetime64; missing birthdays become NaT
+            'birthday': pd.to_datetime(pd.Series(birthday, dtype='float64') - date(1970, 1, 1).toordinal(), unit='D'),
+            'birth_year': pd.Series(birth_year, dtype='float64'),
+            'sex': pd.Categorical(sex),
+        })
+        rooms = pd.DataFrame(self.db_manager.execute_query('SELECT id, name FROM rooms'), columns=['id', 'name'])
+        rooms['id'] = rooms['id'].astype(np.int32)
+        return students, rooms
+
+    def get_query_results(self):
+        """
+        Computes the four reports with vectorized operations and returns them in the same
+        shape, order and value types as QueryExecutor.get_query_results.
+        """
+        import numpy as np
+        import pandas as pd
+        self.timings = {}
+        start = time.perf_counter()
+        students, rooms = self.load_frames()
+        self.timings['load'] = time.perf_counter() - start
+
+        step = time.perf_counter()
+        # SQLite's 'now' is UTC; julianday differences reduce to fractional days since the epoch.
+        now = pd.Timestamp.now(tz='UTC')
+        birthday_days = students['birthday'].to_numpy().astype('datetime64[D]')
+        age_days = np.where(np.isnat(birthday_days), np.nan, now.value / 86_400e9 - birthday_days.astype(np.int64))
+        age_years = now.year - students['birth_year'].to_numpy()
+        # The SQL reports group by room name, so rooms sharing a name are aggregated together. Students
+        # are keyed by their room's name code; those whose room does not exist are dropped, as by the join.
+        name_codes, names = pd.factorize(rooms['name'])
+        student_codes = pd.Series(name_codes, index=rooms['id']).reindex(students['room_id']).to_numpy()
+        frame = pd.DataFrame({'name_code': student_codes, 'age_years': age_years, 'age_days': age_days,
+                              'sex': students['sex']}).dropna(subset=['name_code'])
+        groups = frame.groupby(frame['name_code'].astype(np.int64), sort=False, observed=True)
+        aggregates = pd.DataFrame({
+            'student_count': groups.size(),
+            'avg_age': groups['age_years'].mean(),
+            'age_diff_days': groups['age_days'].max(),
+            'unique_sex_count': groups['sex'].nunique(),
+        })
+        per_name = pd.DataFrame({'name': names}).merge(aggregates, how='left', left_index=True, right_index=True)
+        per_name = per_name.sort_values('name', kind='stable')
+        occupied = per_name[per_name['student_count'].notna()]
+        self.timings['aggregate'] = time.perf_counter() - step
+
+        def rows(df, column):
+            """Converts two columns to a list of tuples of plain Python values, NaN as None."""
+            values = [None if v != v else v for v in df[column].tolist()]
+            return list(zip(df['name'].tolist(), values))
+
+        step = time.perf_counter()
+        results = {}
+        counts = per_name.assign(student_count=per_name['student_count'].fillna(0).astype(np.int64))
+        results['rooms_with_student_count'] = rows(counts, 'student_count')
+        results['min_avg_age_rooms'] = rows(
+            occupied.sort_values('avg_age', kind='stable', na_position='first').head(5), 'avg_age')
+        results['max_age_diff_rooms'] = rows(
+            occupied.sort_values('age_diff_days', ascending=False, kind='stable', na_position='last').head(5),
+            'age_diff_days')
+        mixed = occupied[occupied['unique_sex_count'] > 1]
+        results['mixed_gender_rooms'] = rows(mixed.assign(unique_sex_count=mixed['unique_sex_count'].astype(np.int64)),
+                                             'unique_sex_count')
+        self.timings['reports'] = time.perf_counter() - step
+        self.timings['total'] = time.perf_counter() - start
+        return results
+
+    def iter_query_results(self, reports=None):
+        """Yields (report name, rows) pairs; the columnar engine computes all reports up front."""
+        return ((name, rows) for name, rows in self.get_query_results().items() if reports is None or name in reports)
+
+# Characters XML 1.0 documents cannot contain, even escaped (surrogates fail when encoding to UTF-8)
+INVALID_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+def xml_escape(value):
+    """
+    Escapes element text the way lxml does: &, <, > and carriage returns, which would otherwise be
+    read back as newlines. Raises ValueError, like lxml, for characters that XML cannot hold.
+    """
+    if INVALID_XML_CHARS.search(value):
+        raise ValueError('All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters')
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\r', '&#13;')
+
+# Output field kinds: name -> (JSON encoder, XML text encoder)
+FIELD_KINDS = {
+    'text': (json.encoder.encode_basestring_ascii, lambda value: xml_escape(str(value))),
+    'integer': (repr, str),
+    'round2': (lambda value: repr(round(value, 2)), lambda value: str(round(value, 2))),
+}
+
+class ReportLayout:
+    """
+    The output fields of one report, compiled once into JSON and XML item templates with one
+    encoder per field, so serializing a row is a single %-format of its encoded values.
+    """
+
+    def __init__(self, key, fields):
+        self.tag = key.replace('_', '-')
+        self.json_item = '{' + ','.join(f'\n            "{name}": %s' for name, _ in fields) + '\n        }'
+        self.xml_item = ('\n    <item>' + ''.join(f'\n      <{name}>%s</{name}>' for name, _ in fields)
+                         + '\n    </item>')
+        self.json_encoders = tuple(FIELD_KINDS[kind][0] for _, kind in fields)
+        self.xml_encoders = tuple(FIELD_KINDS[kind][1] for _, kind in fields)
+
+    def json(self, row):
+        """Returns the row as an item of the report's indented JSON array."""
+        return self.json_item % tuple(encode(value) for encode, value in zip(self.json_encoders, row))
+
+    def xml(self, row):
+        """Returns the row as an <item> element of the report's XML."""
+        return self.xml_item % tuple(encode(value) for encode, value in zip(self.xml_encoders, row))
+
+class DataSerializer:
+    """Handles serialization of query results to JSON or XML."""
+    # Output fields of each report, in result row order
+    LAYOUTS = {key: ReportLayout(key, fields) for key, fields in {
+        'rooms_with_student_count': (('room_name', 'text'), ('student_count', 'integer')),
+        'min_avg_age_rooms': (('room_name', 'text'), ('average_age', 'round2')),
+        'max_age_diff_rooms': (('room_name', 'text'), ('age_difference_days', 'round2')),
+        'mixed_gender_rooms': (('room_name', 'text'),),
+    }.items()}
+
+    def __init__(self, chunk_rows=1000):
+        self.chunk_rows = chunk_rows
+
+    def to_json(self, data):
+        """Converts data to JSON format."""
+        out = io.StringIO()
+        self.write_json(data, out)
+        return out.getvalue()
+
+    def to_xml(self, data):
+        """Converts data to XML format."""
+        out = io.BytesIO()
+        self.write_xml(data, out)
+        return out.getvalue()
+
+    def write_json(self, data, out):
+        """
+        Writes data as JSON to a text stream, one report and one chunk of rows at a time.
+        `data` is a dict or an iterable of (report name, rows) pairs; rows may be a live cursor.
+        The output is identical to json.dumps(..., indent=4) of the fully built result.
+        """
+        items = data.items() if isinstance(data, dict) else data
+        out.write('{')
+        first_key = True
+        for key, rows in items:
+            out.write(f"{'' if first_key else ','}\n    {json.dumps(key)}: [")
+            first_key = False
+            self.write_json_rows(out, key, rows)
+        out.write('}' if first_key else '\n}')
+
+    def write_json_rows(self, out, key, rows):
+        """Writes the items of one report's JSON array in chunks of `chunk_rows` and closes the array."""
+        encode = self.LAYOUTS[key].json
+        written = 0
+        rows = iter(rows)
+        while chunk := [encode(row) for row in islice(rows, self.chunk_rows)]:
+            out.write((',' if written else '') + '\n        ' + ',\n        '.join(chunk))
+            written += len(chunk)
+        out.write('\n    ]' if written else ']')
+
+    def write_xml(self, data, out):
+        """
+        Writes data as UTF-8 XML to a binary stream, one chunk of `chunk_rows` items at a time.
+        `data` is a dict or an iterable of (report name, rows) pairs; rows may be a live cursor.
+        The output is identical to the pretty-printed tree built by earlier versions.
+        """
+        items = iter(data.items() if isinstance(data, dict) else data)
+        out.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+        first = next(items, None)
+        if first is None:
+            out.write(b'<results/>\n')
+            return
+        out.write(b'<results>')
+        for key, rows in chain([first], items):
+            layout = self.LAYOUTS[key]
+            rows = iter(rows)
+            chunk = [layout.xml(row) for row in islice(rows, self.chunk_rows)]
+            if not chunk:
+                out.write(f"\n  <{layout.tag}/>".encode('utf-8'))
+                continue
+            out.write(f"\n  <{layout.tag}>".encode('utf-8'))
+            while chunk:
+                out.write(''.join(chunk).encode('utf-8'))
+                chunk = [layout.xml(row) for row in islice(rows, self.chunk_rows)]
+            out.write(f"\n  </{layout.tag}>".encode('utf-8'))
+        out.write(b'\n</results>\n')
+
+class ResultCache:
+    """
+    Two-tier cache of serialized reports: an in-process LRU bounded by total size in bytes,
+    backed by an optional directory of files that survives restarts. Keys are tuples whose first
+    element is the generation the entry belongs to, such as ((data version, date), query id,
+    format); each generation has its own subdirectory, so prune() can drop every entry of the
+    generations that are no longer current. Hit, miss and eviction counters are kept in `stats`,
+    along with `waits`: requests that found their entry being rendered and waited for it.
+    """
+    def __init__(self, max_bytes=64 * 2**20, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.size = 0
+        # Shared by the report server's worker threads
+        self.lock = threading.RLock()
+        # Key -> Future of the render that is filling the entry (see get_or_render)
+        self.in_flight = {}
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'waits': 0, 'evictions': 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def generation_dir(self, generation):
+        """Returns the directory that holds the on-disk entries of one generation."""
+        return os.path.join(self.cache_dir, hashlib.sha256(repr(generation).encode('utf-8')).hexdigest())
+
+    def disk_path(self, key):
+        """Returns the file that holds `key` in the on-disk tier."""
+        name = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.generation_dir(key[0]), f"{name}.bin")
+
+    def get(self, key):
+        """Returns the cached bytes for `key`, or None on a miss."""
+        with self.lock:
+            return self.lookup(key)
+
+    def get_or_render(self, key, render):
+        """
+        Returns the cached bytes for `key`, calling render() and storing its result on a miss. While
+        one thread renders a key, other threads asking for the same key wait for that result instead
+        of running the queries again; if the render fails, they get its exception.
+        """
+        with self.lock:
+            rendering = self.in_flight.get(key)
+            if rendering is None:
+                value = self.lookup(key)
+                if value is not None:
+                    return value
+                # Imported here, like in load_shards: only misses need it, and it adds to startup time
+                from concurrent.futures import Future
+                future = self.in_flight[key] = Future()
+            else:
+                self.stats['waits'] += 1
+        if rendering is not None:
+            return rendering.result()
+        try:
+            value = render()
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def lookup(self, key):
+        """Looks `key` up in memory, then on disk; the caller holds the lock."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return self.entries[key]
+        if self.cache_dir:
+            try:
+                with open(self.disk_path(key), 'rb') as f:
+                    value = f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                self.stats['disk_hits'] += 1
+                self.remember(key, value)
+                return value
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key, value):
+        """Stores `value` under `key` in memory and, if configured, on disk."""
+        with self.lock:
+            self.remember(key, value)
+        if self.cache_dir:
+            path = self.disk_path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(value)
+                os.replace(tmp_path, path)
+            except FileNotFoundError:
+                # The generation was pruned meanwhile by another thread; the entry is stale anyway
+                pass
+
+    def prune(self, generation):
+        """Drops the entries of every generation other than `generation`, in memory and on disk."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] != generation]:
+                self.size -= len(self.entries.pop(key))
+        if self.cache_dir:
+            keep = self.generation_dir(generation)
+            # Only generation directories (and entry files of the earlier flat layout) are removed,
+            # so nothing else that happens to live in cache_dir is touched
+            for path in glob.glob(os.path.join(glob.escape(self.cache_dir), '[0-9a-f]' * 64)):
+                if path != keep:
+                    shutil.rmtree(path, ignore_errors=True)
+            for path in glob.glob(os.path.join(glob.escape(self.cache_dir), '[0-9a-f]' * 64 + '.bin')):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def remember(self, key, value):
+        """Adds an entry to the in-memory tier, evicting least recently used entries to stay within max_bytes."""
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        if len(value) > self.max_bytes:
+            return
+        self.entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.stats['evictions'] += 1
+
+class CachedReports:
+    """
+    Serves serialized reports from a ResultCache, running the queries only on a miss. Entries are
+    keyed by the data version and the UTC date, since the ages in the reports depend on the current
+    date; entries of any other version or date are pruned when either changes.
+    """
+    def __init__(self, db_manager, query_executor, serializer, cache):
+        self.db_manager = db_manager
+        self.query_executor = query_executor
+        self.serializer = serializer
+        self.cache = cache
+        self.generation = None
+
+    def render(self, output_format, report=None, use_cache=True):
+        """
+        Returns the reports (or just `report`) as JSON or XML bytes. With use_cache=False the queries
+        run and the output is serialized on every call, bypassing the cache entirely.
+        """
+        if not use_cache:
+            return self.serialize(output_format, report)
+        generation = (self.db_manager.data_version(), time.strftime('%Y-%m-%d', time.gmtime()))
+        if generation != self.generation:
+            self.cache.prune(generation)
+            self.generation = generation
+        key = (generation, report or 'all', output_format)
+        return self.cache.get_or_render(key, lambda: self.serialize(output_format, report))
+
+    def serialize(self, output_format, report=None):
+        """Runs the queries of every report (or just `report`) and serializes their rows."""
+        results = self.query_executor.iter_query_results([report] if report else None)
+        if output_format == 'json':
+            return self.serializer.to_json(results).encode('utf-8')
+        return self.serializer.to_xml(results)
+
+def load_inputs(db_manager, data_loader, students, rooms, workers=None):
+    """Creates the schema and loads the input files: bulk into a fresh database, incrementally otherwise."""
+    db_manager.create_schema()
+    students_files = resolve_input_files(students)
+    if db_manager.is_empty():
+        # Fresh database: load without indexes, then build them once
+        return data_loader.bulk_load(students_files, rooms, workers)
+    load_results = data_loader.load_data(students_files, rooms, workers)
+    db_manager.create_indexes()
+    return load_results
+
+def print_load_results(load_results):
+    """Prints one line per loaded file and a summary of failures."""
+    for result in load_results:
+        if result.status == 'failed':
+            print(f"{result.path}: FAILED after {result.seconds:.2f}s: {result.error}")
+        elif result.status == 'unchanged':
+            print(f"{result.path}: unchanged, skipped.")
+        elif result.status == 'removed':
+            print(f"{result.path}: no longer an input, {result.changed} rows deleted.")
+        else:
+            print(f"{result.path}: {result.rows} rows read, {result.changed} inserted, updated or deleted "
+                  f"in {result.seconds:.2f}s.")
+    failed = sum(result.status == 'failed' for result in load_results)
+    if failed:
+        print(f"Data loaded with errors: {failed} of {len(load_results)} files failed.")
+    else:
+        print("Data loaded successfully.")
+
+# The main function to tie everything together and create a CLI
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load student data into a database and run queries.")
+    parser.add_argument('--students', required=True,
+                        help='Path to the students JSON file, or a directory or glob pattern of shard files')
+    parser.add_argument('--rooms', required=True, help='Path to the rooms JSON file')
+    parser.add_argument('--format', choices=['json', 'xml'], required=True, help='Output format: json or xml')
+    parser.add_argument('--engine', choices=['sqlite', 'columnar'], default='sqlite',
+                        help='sqlite runs the reports as SQL; columnar computes them with pandas/NumPy')
+    parser.add_argument('--strategy', choices=QueryExecutor.STRATEGIES, default='per-query',
+                        help='per-query runs one scan per report; single-pass computes all reports in one scan; '
+                             'room-stats reads the trigger-maintained per-room statistics (sqlite engine only)')
+    parser.add_argument('--timings', action='store_true', help='Print how long each query step took')
+    parser.add_argument('--output', help='Write the results to this file instead of stdout')
+    parser.add_argument('--cache-dir', help='Cache serialized reports in this directory, keyed by data version')
+    parser.add_argument('--workers', type=int, help='Processes used to parse student shards (default: CPU count)')
+    parser.add_argument('--db', default=':memory:',
+                        help='SQLite database file; reruns only reload input that changed (default: in-memory)')
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db)
+    data_loader = DataLoader(db_manager)
+    if args.engine == 'columnar':
+        query_executor = ColumnarQueryExecutor(db_manager)
+    else:
+        query_executor = QueryExecutor(db_manager, args.strategy)
+    serializer = DataSerializer()
+
+    try:
+        load_results = load_inputs(db_manager, data_loader, args.students, args.rooms, args.workers)
+        print_load_results(load_results)
+        print("Indexes created for optimization.")
+
+        if args.output:
+            out = open(args.output, 'wb')
+        else:
+            print("\nQuery Results:")
+            sys.stdout.flush()
+            out = sys.stdout.buffer
+        try:
+            if args.cache_dir:
+                cached_reports = CachedReports(db_manager, query_executor, serializer,
+                                               ResultCache(cache_dir=args.cache_dir))
+                out.write(cached_reports.render(args.format))
+            elif args.format == 'json':
+                # Rows stream from the cursors straight into the output; nothing is built in memory
+                text = io.TextIOWrapper(out, encoding='utf-8', write_through=True)
+                serializer.write_json(query_executor.iter_query_results(), text)
+                text.detach()
+            else:
+                serializer.write_xml(query_executor.iter_query_results(), out)
+        finally:
+            out.flush()
+            if args.output:
+                out.close()
+
+        if args.output:
+            print(f"\nQuery results written to {args.output}")
+        else:
+            print()
+        if args.cache_dir:
+            print(f"\nCache: {cached_reports.cache.stats}")
+
+        if args.timings:
+            print("\nQuery timings:")
+            for step, seconds in query_executor.timings.items():
+                print(f"  {step}: {seconds * 1000:.2f} ms")
+
+    finally:
         db_manager.close()
\ No newline at end of file
@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from process_data import (
+    CachedReports, ColumnarQueryExecutor, DatabaseManager, DataLoader, DataSerializer, QueryExecutor, ResultCache,
+    load_inputs, print_load_results,
+)
+
+CONTENT_TYPES = {'json': 'application/json', 'xml': 'application/xml'}
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class ReportServer:
+    """
+    Long-running report service: the data is loaded once, then report requests are answered over
+    HTTP from a pool of read-only SQLite connections, so concurrent requests do not queue on a
+    single shared cursor. Serialized reports are shared between connections through one ResultCache.
+    """
+    def __init__(self, db_path, pool_size=4, engine='sqlite', strategy='per-query', cache_bytes=64 * 2**20,
+                 cache_dir=None):
+        self.cache = ResultCache(max_bytes=cache_bytes, cache_dir=cache_dir)
+        self.pool_size = pool_size
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='report')
+        self.pool = asyncio.Queue()
+        self.connections = []
+        for _ in range(pool_size):
+            db_manager = DatabaseManager(db_path, read_only=True)
+            if engine == 'columnar':
+                query_executor = ColumnarQueryExecutor(db_manager)
+            else:
+                query_executor = QueryExecutor(db_manager, strategy)
+            self.connections.append(db_manager)
+            self.pool.put_nowait(CachedReports(db_manager, query_executor, DataSerializer(), self.cache))
+        self.requests = 0
+
+    async def render(self, output_format, report, use_cache=True):
+        """Borrows a pooled connection and renders the report on a worker thread."""
+        reports = await self.pool.get()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, reports.render, output_format, report, use_cache)
+        finally:
+            self.pool.put_nowait(reports)
+
+    async def route(self, method, target):
+        """Returns (status, content type, body) for one request."""
+        url = urlsplit(target)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if method != 'GET':
+            return 405, 'text/plain', b'Only GET is supported\n'
+        if url.path == '/stats':
+            stats = dict(self.cache.stats, requests=self.requests, entries=len(self.cache.entries),
+                         cache_bytes=self.cache.size, idle_connections=self.pool.qsize(), pool_size=self.pool_size)
+            return 200, 'application/json', json.dumps(stats).encode('utf-8')
+        if url.path != '/reports':
+            return 404, 'text/plain', b'Try /reports?format=json|xml[&report=NAME][&cache=off] or /stats\n'
+
+        output_format = params.get('format', 'json')
+        report = params.get('report')
+        cache = params.get('cache', 'on')
+        if output_format not in CONTENT_TYPES:
+            return 400, 'text/plain', b'format must be json or xml\n'
+        if cache not in ('on', 'off'):
+            return 400, 'text/plain', b'cache must be on or off\n'
+        if report and report not in QueryExecutor.REPORTS:
+            return 400, 'text/plain', f"report must be one of {', '.join(QueryExecutor.REPORTS)}\n".encode('utf-8')
+        return 200, CONTENT_TYPES[output_format], await self.render(output_format, report, cache == 'on')
+
+    async def handle_connection(self, reader, writer):
+        """Serves HTTP/1.1 requests on one client connection until it is closed."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip().lower()
+
+                self.requests += 1
+                try:
+                    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                    status, content_type, body = await self.route(method, target)
+                except Exception as e:
+                    status, content_type, body = 500, 'text/plain', f"{type(e).__name__}: {e}\n".encode('utf-8')
+
+                keep_alive = headers.get('connection') != 'close'
+                writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                              f"Content-Type: {content_type}\r\n"
+                              f"Content-Length: {len(body)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1'))
+                writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        """Shuts down the worker threads and closes the pooled connections."""
+        self.executor.shutdown()
+        for db_manager in self.connections:
+            db_manager.close()
+
+
+async def serve(server, host, port, unix_socket):
+    """Listens on a TCP port or a Unix socket until cancelled."""
+    if unix_socket:
+        listener = await asyncio.start_unix_server(server.handle_connection, path=unix_socket)
+        print(f"Serving reports on unix:{unix_socket}")
+    else:
+        listener = await asyncio.start_server(server.handle_connection, host, port)
+        print(f"Serving reports on http://{host}:{port}/reports?format=json")
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load student data once and serve the room reports over HTTP.")
+    parser.add_argument('--students', required=True,
+                        help='Path to the students JSON file, or a directory or glob pattern of shard files')
+    parser.add_argument('--rooms', required=True, help='Path to the rooms JSON file')
+    parser.add_argument('--db', help='SQLite database file (default: a temporary file removed on exit)')
+    parser.add_argument('--engine', choices=['sqlite', 'columnar'], default='sqlite')
+    parser.add_argument('--strategy', choices=QueryExecutor.STRATEGIES, default='per-query')
+    parser.add_argument('--pool-size', type=int, default=4, help='Number of read-only connections')
+    parser.add_argument('--cache-bytes', type=int, default=64 * 2**20, help='Size of the in-process report cache')
+    parser.add_argument('--cache-dir', help='Also keep serialized reports in this directory across restarts')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-socket', help='Listen on this Unix socket instead of a TCP port')
+    parser.add_argument('--workers', type=int, help='Processes used to parse student shards (default: CPU count)')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if args.db is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp_dir.name, 'students.db')
+
+    db_manager = DatabaseManager(args.db)
+    try:
+        print_load_results(load_inputs(db_manager, DataLoader(db_manager), args.students, args.rooms, args.workers))
+    finally:
+        db_manager.close()
+
+    server = ReportServer(args.db, args.pool_size, args.engine, args.strategy, args.cache_bytes, args.cache_dir)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if tmp_dir:
+            tmp_dir.cleanup()
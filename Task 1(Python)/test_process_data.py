@@ -0,0 +1,152 @@
+import json
+import os
+import random
+import threading
+import time
+
+import pytest
+
+from process_data import CachedReports, ColumnarQueryExecutor, DatabaseManager, DataLoader, DataSerializer, \
+    QueryExecutor, ResultCache, iter_json_array, xml_escape
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STUDENTS_FILE = os.path.join(HERE, 'students (1).json')
+ROOMS_FILE = os.path.join(HERE, 'rooms (1).json')
+
+
+def random_json_value(rng, depth=0):
+    """Returns a random JSON value: numbers with fractions and exponents, escaped strings, literals, nesting."""
+    kind = rng.choice(['int', 'float', 'string', 'literal'] + (['array', 'object'] if depth < 3 else []))
+    if kind == 'int':
+        return rng.randint(-10**12, 10**12)
+    if kind == 'float':
+        return rng.choice([rng.uniform(-1e3, 1e3), rng.uniform(-1, 1) * 10.0 ** rng.randint(-30, 30), 0.5])
+    if kind == 'string':
+        return ''.join(rng.choice('ab \\"/\n\t\u00e9\u20ac\U0001f600') for _ in range(rng.randint(0, 8)))
+    if kind == 'literal':
+        return rng.choice([True, False, None])
+    if kind == 'array':
+        return [random_json_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {f'k{i}': random_json_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+
+@pytest.fixture(scope='module')
+def db_manager():
+    db_manager = DatabaseManager()
+    db_manager.create_schema()
+    DataLoader(db_manager).load_data(STUDENTS_FILE, ROOMS_FILE)
+    yield db_manager
+    db_manager.close()
+
+
+@pytest.fixture(autouse=True)
+def fixed_now(monkeypatch):
+    """Pins the current time, so the age-difference report is the same in every run."""
+    now = QueryExecutor.now()
+    monkeypatch.setattr(QueryExecutor, 'now', staticmethod(lambda: now))
+
+
+@pytest.mark.parametrize('output_format', ['json', 'xml'])
+@pytest.mark.parametrize('report', QueryExecutor.REPORTS)
+@pytest.mark.parametrize('strategy', QueryExecutor.STRATEGIES)
+def test_render_one_report(db_manager, strategy, report, output_format):
+    query_executor = QueryExecutor(db_manager, strategy)
+    serializer = DataSerializer()
+    reports = CachedReports(db_manager, query_executor, serializer, ResultCache())
+    expected = {report: query_executor.get_query_results()[report]}
+    if output_format == 'json':
+        assert reports.render(output_format, report) == serializer.to_json(expected).encode('utf-8')
+    else:
+        assert reports.render(output_format, report) == serializer.to_xml(expected)
+    # Skipped reports leave nothing open that would block the next run
+    assert list(query_executor.get_query_results()) == list(QueryExecutor.REPORTS)
+
+
+@pytest.mark.parametrize('report', QueryExecutor.REPORTS)
+def test_render_one_report_columnar(db_manager, report):
+    pytest.importorskip('pandas')
+    reports = CachedReports(db_manager, ColumnarQueryExecutor(db_manager), DataSerializer(), ResultCache())
+    assert list(json.loads(reports.render('json', report))) == [report]
+
+
+def test_disk_cache_keeps_only_current_generation(db_manager, tmp_path, monkeypatch):
+    (tmp_path / 'notes.txt').write_text('not a cache entry')
+    reports = CachedReports(db_manager, QueryExecutor(db_manager), DataSerializer(), ResultCache(cache_dir=str(tmp_path)))
+    output = reports.render('json', 'mixed_gender_rooms')
+    assert reports.render('json', 'mixed_gender_rooms') == output
+    assert reports.cache.stats['hits'] == 1
+
+    # A new day: the previous day's entries are neither served nor kept
+    tomorrow = time.gmtime(time.time() + 86400)
+    monkeypatch.setattr(time, 'gmtime', lambda *args: tomorrow)
+    restarted = CachedReports(db_manager, QueryExecutor(db_manager), DataSerializer(), ResultCache(cache_dir=str(tmp_path)))
+    restarted.render('json', 'mixed_gender_rooms')
+    assert restarted.cache.stats == {'hits': 0, 'disk_hits': 0, 'misses': 1, 'waits': 0, 'evictions': 0}
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        [os.path.basename(restarted.cache.generation_dir(restarted.generation)), 'notes.txt']
+
+
+@pytest.mark.parametrize('text', ['a & b <c> "d" \'e\'', 'line\r\nbreak\ttab', 'caf\u00e9 \U0001f600', '\x00', '\x0b', '\ufffe'])
+def test_xml_escape_matches_lxml(text):
+    etree = pytest.importorskip('lxml.etree')
+    element = etree.Element('room_name')
+    try:
+        element.text = text
+    except ValueError:
+        with pytest.raises(ValueError):
+            xml_escape(text)
+        return
+    assert etree.tostring(element, encoding='unicode') == f'<room_name>{xml_escape(text)}</room_name>'
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 7, 64])
+def test_iter_json_array_matches_json_loads(tmp_path, read_size):
+    rng = random.Random(read_size)
+    path = tmp_path / 'array.json'
+    for _ in range(100):
+        values = [random_json_value(rng) for _ in range(rng.randint(0, 6))]
+        text = json.dumps(values, indent=rng.choice([None, 2]), ensure_ascii=rng.random() < 0.5) + rng.choice(['', '\n'])
+        path.write_text(text, encoding='utf-8')
+        assert list(iter_json_array(str(path), read_size)) == json.loads(text), text
+
+
+@pytest.mark.parametrize('text, message', [
+    ('[' + ' ' * 65533 + '0.5]', None),
+    ('[1]x', 'unexpected data after the JSON array at character 3'),
+    ('[] ,', 'unexpected data after the JSON array at character 3'),
+    ('["abc', 'Unterminated string starting at character 1'),
+    ('[1 2]', "expected ',' or ']' at character 3"),
+])
+def test_iter_json_array_boundaries_and_errors(tmp_path, text, message):
+    path = tmp_path / 'array.json'
+    path.write_text(text)
+    if message is None:
+        assert list(iter_json_array(str(path))) == json.loads(text)
+    else:
+        with pytest.raises(ValueError) as error:
+            list(iter_json_array(str(path)))
+        assert str(error.value).endswith(message)
+
+
+def test_concurrent_misses_render_once():
+    cache = ResultCache()
+    renders = []
+
+    def render():
+        renders.append(threading.get_ident())
+        # Hold the render until every other thread is waiting on it
+        deadline = time.monotonic() + 10
+        while cache.stats['waits'] < 7 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return b'report'
+
+    outputs = []
+    threads = [threading.Thread(target=lambda: outputs.append(cache.get_or_render('key', render))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outputs == [b'report'] * 8
+    assert len(renders) == 1
+    assert cache.stats['misses'] == 1 and cache.stats['waits'] == 7
+    assert cache.get_or_render('key', render) == b'report' and len(renders) == 1
@@ -0,0 +1,154 @@
+import argparse
+import time
+from datetime import date
+
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import (
+    array, col, concat, element_at, lit, lower, pmod, timestamp_seconds, to_date, unix_timestamp, when,
+    xxhash64,
+)
+
+from sakila_source import PARTITIONS, SAMPLE_DATA, SCHEMAS, parse_date, sample_tables, write_jdbc, write_parquet
+
+CATEGORIES = [name for _, name in SAMPLE_DATA["category"]]
+FIRST_NAMES = ["MARY", "PATRICIA", "LINDA", "BARBARA", "ELIZABETH", "JENNIFER", "MARIA", "SUSAN", "JOHN", "JAMES",
+               "ROBERT", "MICHAEL", "WILLIAM", "DAVID", "PENELOPE", "NICK", "ED", "JOHNNY", "BETTE", "GRACE"]
+LAST_NAMES = ["SMITH", "JOHNSON", "WILLIAMS", "JONES", "BROWN", "DAVIS", "MILLER", "WILSON", "MOORE", "TAYLOR",
+              "GUINESS", "WAHLBERG", "CHASE", "LOLLOBRIGIDA", "SWANK", "FAWCETT", "HUDSON", "PALTROW"]
+# City names are prefix + suffix, so some start with 'A' and some contain a '-', as problem 7 looks for
+CITY_PREFIXES = ["A", "Aber", "Bran", "Cal", "Dun", "East", "Fair", "Glen", "Har", "Kings", "Lake", "Mill"]
+CITY_SUFFIXES = ["ton", "field", "-on-Sea", "ville", "-le-Grand", "burg", "mouth", " Falls"]
+DISTRICTS = ["California", "Texas", "Florida", "New York", "Ontario", "Bavaria", "Kanto", "Gauteng"]
+RENTAL_RATES = [0.99, 2.99, 4.99]
+
+
+def pick(column, salt, n):
+    """Deterministic pseudo-random integer in [0, n) per row, so reruns produce the same dataset."""
+    return pmod(xxhash64(column, lit(salt)), lit(n))
+
+
+def choice(column, salt, values):
+    """Deterministic pseudo-random element of a Python list per row."""
+    return element_at(array(*[lit(value) for value in values]), (pick(column, salt, len(values)) + 1).cast("int"))
+
+
+def typed(df, table):
+    """Casts the generated columns to the table's schema, in schema order."""
+    return df.select([col(field.name).cast(field.dataType) for field in SCHEMAS[table].fields])
+
+
+def synthetic_tables(spark, rentals, start, days):
+    """
+    Builds a Sakila-shaped dataset with `rentals` rentals spread evenly over `days` days from `start`,
+    one payment per rental, and dimension tables scaled with the rental count like the real database
+    (16044 rentals: 1000 films, 4581 inventory items, 599 customers). Every table is generated by
+    executors from spark.range, so nothing is materialized on the driver.
+    """
+    films = max(1000, rentals // 16)
+    inventory = films * 9 // 2
+    customers = max(600, rentals // 27)
+    cities = max(600, customers // 10)
+    actors = max(200, films // 5)
+    # The last 5% of films get no inventory, for problem 4
+    stocked_films = films * 19 // 20
+    start_seconds = int(time.mktime(start.timetuple()))
+    seconds_per_rental = days * 86400 / max(rentals, 1)
+    ids = col("id")
+
+    tables = {}
+    tables["category"] = typed(spark.createDataFrame(list(enumerate(CATEGORIES, 1)), ["category_id", "name"]), "category")
+    tables["actor"] = typed(spark.range(1, actors + 1).select(
+        ids.alias("actor_id"), choice(ids, "actor-first", FIRST_NAMES).alias("first_name"),
+        choice(ids, "actor-last", LAST_NAMES).alias("last_name")), "actor")
+    tables["film"] = typed(spark.range(1, films + 1).select(
+        ids.alias("film_id"), concat(lit("MOVIE "), ids).alias("title"),
+        (pick(ids, "duration", 5) + 3).alias("rental_duration"),
+        choice(ids, "rate", RENTAL_RATES).alias("rental_rate"),
+        (pick(ids, "length", 140) + 46).alias("length"),
+        (pick(ids, "cost", 21) + 9.99).alias("replacement_cost")), "film")
+    # Five actors per film and one category per film, plus a second category for every tenth film
+    tables["film_actor"] = typed(spark.range(0, films * 5).select(
+        (pick(ids, "film-actor", actors) + 1).alias("actor_id"), (ids / 5 + 1).cast("long").alias("film_id")),
+        "film_actor").distinct()
+    tables["film_category"] = typed(spark.range(0, films + films // 10).select(
+        (pmod(ids, lit(films)) + 1).alias("film_id"),
+        (pick(ids, "film-category", len(CATEGORIES)) + 1).alias("category_id")), "film_category").distinct()
+    tables["inventory"] = typed(spark.range(1, inventory + 1).select(
+        ids.alias("inventory_id"), (pick(ids, "inventory-film", stocked_films) + 1).alias("film_id"),
+        (pick(ids, "store", 2) + 1).alias("store_id")), "inventory")
+    tables["city"] = typed(spark.range(1, cities + 1).select(
+        ids.alias("city_id"),
+        concat(choice(ids, "city-prefix", CITY_PREFIXES), choice(ids, "city-suffix", CITY_SUFFIXES),
+               lit(" "), ids).alias("city")), "city")
+    tables["address"] = typed(spark.range(1, customers + 1).select(
+        ids.alias("address_id"), concat(pick(ids, "street", 999) + 1, lit(" Main St")).alias("address"),
+        choice(ids, "district", DISTRICTS).alias("district"),
+        (pick(ids, "address-city", cities) + 1).alias("city_id")), "address")
+    first_name = choice(ids, "customer-first", FIRST_NAMES)
+    last_name = choice(ids, "customer-last", LAST_NAMES)
+    tables["customer"] = typed(spark.range(1, customers + 1).select(
+        ids.alias("customer_id"), (pick(ids, "customer-store", 2) + 1).alias("store_id"),
+        first_name.alias("first_name"), last_name.alias("last_name"),
+        concat(lower(first_name), lit("."), lower(last_name), ids, lit("@example.com")).alias("email"),
+        ids.alias("address_id"),
+        when(pick(ids, "active", 10) < 8, 1).otherwise(0).alias("active")), "customer")
+
+    # Rentals are in id order, so each range partition covers a contiguous run of days
+    rental_seconds = lit(start_seconds) + (ids - 1) * seconds_per_rental + pick(ids, "rental-jitter", 60)
+    rental_df = spark.range(1, rentals + 1).select(
+        ids.alias("rental_id"),
+        timestamp_seconds(rental_seconds.cast("long")).alias("rental_date"),
+        (pick(ids, "rental-inventory", inventory) + 1).alias("inventory_id"),
+        (pick(ids, "rental-customer", customers) + 1).alias("customer_id"),
+        # Rentals last between 1 hour and 10 days
+        timestamp_seconds((rental_seconds + (pick(ids, "rental-hours", 240) + 1) * 3600).cast("long"))
+        .alias("return_date"))
+    tables["rental"] = typed(rental_df, "rental")
+    tables["payment"] = typed(tables["rental"].select(
+        col("rental_id").alias("payment_id"), "customer_id", "rental_id",
+        choice(col("rental_id"), "amount", RENTAL_RATES).alias("amount"),
+        timestamp_seconds(unix_timestamp("return_date") + pick(col("rental_id"), "paid", 3600)).alias("payment_date")),
+        "payment")
+
+    for table, (day_column, timestamp_column) in PARTITIONS.items():
+        tables[table] = tables[table].withColumn(day_column, to_date(col(timestamp_column)))
+    return tables
+
+
+def parse_count(value):
+    """Parses row counts such as 16044, 1M or 100M."""
+    multipliers = {"k": 10**3, "m": 10**6}
+    suffix = value[-1].lower()
+    if suffix in multipliers:
+        return int(float(value[:-1]) * multipliers[suffix])
+    return int(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic Sakila dataset for spark_analysis.py.")
+    parser.add_argument("--rentals", type=parse_count, default=10**6, help="Number of rentals, e.g. 1M or 100M")
+    parser.add_argument("--days", type=int, default=365, help="Number of days the rentals are spread over")
+    parser.add_argument("--start", type=parse_date, default=date(2023, 1, 1), help="First rental day (YYYY-MM-DD)")
+    parser.add_argument("--sample", action="store_true", help="Write the built-in sample data instead")
+    parser.add_argument("--format", choices=["parquet", "jdbc"], default="parquet")
+    parser.add_argument("--path", required=True, help="Output directory, or JDBC url such as jdbc:sqlite:sakila.db")
+    args = parser.parse_args()
+
+    spark = SparkSession.builder \
+        .appName("SakilaGenerator") \
+        .getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+
+    if args.sample:
+        tables = sample_tables(spark)
+    else:
+        tables = synthetic_tables(spark, args.rentals, args.start, args.days)
+    started = time.perf_counter()
+    if args.format == "parquet":
+        write_parquet(tables, args.path)
+    else:
+        write_jdbc(tables, args.path)
+    print(f"Wrote {'sample' if args.sample else args.rentals} rentals to {args.path} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    spark.stop()
@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+
+from pyspark import StorageLevel
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import broadcast, col, count, max, min, sum
+
+from sakila_pipeline import city_predicates, rental_categories, rental_cities, rental_facts, top_category_by_city_filter
+from sakila_source import PARTITIONS, load_tables
+
+# Aggregates kept between runs: name -> (key columns, {value column: function combining old and new values})
+AGGREGATES = {
+    "rentals_per_actor": (["actor_id"], {"rental_count": sum}),
+    "spend_per_category": (["category_name"], {"total_spent": sum}),
+    "hours_per_category_city": (["city", "category_name"], {"total_hours": sum}),
+    # The range of rental ids on each rental day, to find the day partitions holding the rentals
+    # that new payments are for
+    "rental_id_ranges": (["rental_day"], {"min_rental_id": min, "max_rental_id": max}),
+}
+# Rentals not yet returned at the last run, as (rental_id, rental_day); replaced on every run
+OPEN_RENTALS = "open_rentals"
+# Bumped whenever the tables kept in the state change
+STATE_FORMAT = 2
+
+
+def read_state(state_dir):
+    """
+    Returns the state of the last run from `<state_dir>/state.json`: the version directory holding the
+    aggregates (`<state_dir>/v<version>/<aggregate>` as Parquet) and the rental/payment watermarks,
+    i.e. the latest event timestamp already folded into them.
+    """
+    path = os.path.join(state_dir, "state.json")
+    if not os.path.exists(path):
+        return {"version": 0, "watermarks": {}}
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("format", 1) != STATE_FORMAT:
+        raise ValueError(f"{path} was written by an earlier version of this script; rerun with --rebuild")
+    return state
+
+
+def read_aggregate(spark, state_dir, state, name):
+    """Returns a stored aggregate or the open rentals, or None before the first run."""
+    if state["version"] == 0:
+        return None
+    return spark.read.parquet(os.path.join(state_dir, f"v{state['version']}", name))
+
+
+def write_state(state_dir, state, aggregates, watermarks):
+    """
+    Writes the merged aggregates as a new version, then points state.json at it. state.json is replaced
+    atomically, so a run that fails part way leaves the previous state in use.
+    """
+    version = state["version"] + 1
+    for name, df in aggregates.items():
+        df.write.mode("overwrite").parquet(os.path.join(state_dir, f"v{version}", name))
+
+    path = os.path.join(state_dir, "state.json")
+    new_state = {"format": STATE_FORMAT, "version": version, "watermarks": watermarks}
+    with open(path + ".tmp", "w") as f:
+        json.dump(new_state, f, indent=2)
+    os.replace(path + ".tmp", path)
+    shutil.rmtree(os.path.join(state_dir, f"v{state['version']}"), ignore_errors=True)
+    return new_state
+
+
+def new_rows(df, table, watermark, high_watermark=None):
+    """
+    Returns the rows of a fact table with an event timestamp after `watermark` and, if given, at or
+    before `high_watermark`. The bound on the day partition column lets a Parquet source skip every
+    partition before the watermark.
+    """
+    day_column, timestamp_column = PARTITIONS[table]
+    if watermark is not None:
+        df = df.filter((col(day_column) >= watermark.date()) & (col(timestamp_column) > watermark))
+    if high_watermark is not None:
+        df = df.filter(col(timestamp_column) <= high_watermark)
+    return df
+
+
+def rentals_on_days(rental_df, days):
+    """
+    Returns the rentals made on the given days. A Parquet source reads only those day partitions,
+    and the bounds on rental_date restrict a JDBC query.
+    """
+    day_column, timestamp_column = PARTITIONS["rental"]
+    if not days:
+        return rental_df.limit(0)
+    days = sorted(days)
+    return rental_df.filter(col(day_column).isin(days)
+                            & (col(timestamp_column) >= datetime.combine(days[0], datetime.min.time()))
+                            & (col(timestamp_column) < datetime.combine(days[-1] + timedelta(days=1), datetime.min.time())))
+
+
+def distinct_days(df):
+    """Collects the distinct rental days of a DataFrame; there is one per day, not per rental."""
+    day_column = PARTITIONS["rental"][0]
+    return [row[0] for row in df.select(day_column).distinct().collect()]
+
+
+def paid_rentals(rental_df, new_payments, rental_id_ranges_df):
+    """
+    Returns the rentals that new payments are for. A payment may be for a rental from any earlier
+    run, so the rental days are first looked up among the stored rental id ranges, and only those
+    days are read instead of the whole rental history.
+    """
+    payment_rental_ids = new_payments.select("rental_id")
+    days_df = payment_rental_ids.join(
+        broadcast(rental_id_ranges_df),
+        col("rental_id").between(col("min_rental_id"), col("max_rental_id")))
+    return rentals_on_days(rental_df, distinct_days(days_df)).join(payment_rental_ids, "rental_id", "left_semi")
+
+
+def rental_id_ranges(rentals):
+    """The lowest and highest rental id on each rental day."""
+    return rentals.groupBy(PARTITIONS["rental"][0]) \
+        .agg(min("rental_id").alias("min_rental_id"), max("rental_id").alias("max_rental_id"))
+
+
+def deltas(tables, new_rentals, returned_rentals, new_payments, paid_rentals_df):
+    """
+    Aggregates only the new rows, keyed like AGGREGATES: rentals per actor from the new rentals,
+    rental hours from the rentals returned since the last run and spend from the new payments.
+    """
+    rentals_per_actor = rental_facts(new_rentals, tables["inventory"]).join(tables["film_actor"], "film_id") \
+        .groupBy("actor_id") \
+        .agg(count("rental_id").alias("rental_count"))
+    hours_per_category_city = rental_cities(
+        rental_categories(rental_facts(returned_rentals, tables["inventory"]),
+                          tables["film_category"], tables["category"]),
+        tables["customer"], tables["address"], tables["city"]) \
+        .groupBy("city", "category_name") \
+        .agg(sum("rental_duration_hours").alias("total_hours"))
+    spend_per_category = new_payments.select("rental_id", "amount") \
+        .join(rental_categories(rental_facts(paid_rentals_df, tables["inventory"]),
+                                tables["film_category"], tables["category"]), "rental_id") \
+        .groupBy("category_name") \
+        .agg(sum("amount").alias("total_spent"))
+    return {
+        "rentals_per_actor": rentals_per_actor,
+        "spend_per_category": spend_per_category,
+        "hours_per_category_city": hours_per_category_city,
+    }
+
+
+def merge(previous_df, delta_df, keys, values):
+    """Combines the stored per-key values with the new ones, e.g. adding totals."""
+    if previous_df is None:
+        return delta_df
+    return previous_df.unionByName(delta_df) \
+        .groupBy(*keys) \
+        .agg(*[combine(value).alias(value) for value, combine in values.items()])
+
+
+def run_increment(spark, tables, state_dir):
+    """
+    Folds the rentals and payments that arrived since the last run into the stored aggregates and
+    returns the new state, or the old one when there is nothing new. New rentals and payments are
+    found by their event timestamps, so rows must arrive in event-time order: a row arriving with a
+    timestamp at or before the watermark is not picked up. A rental's return_date may be filled in
+    later: rentals still out are kept in the state, and their hours are counted in the run that
+    finds them returned. Each run reads only the day partitions of new rows, of rentals still out
+    and of rentals that new payments are for.
+    """
+    state = read_state(state_dir)
+    watermarks, new_tables = {}, {}
+    for table, (_, timestamp_column) in PARTITIONS.items():
+        watermark = state["watermarks"].get(table)
+        watermark = datetime.fromisoformat(watermark) if watermark else None
+        # Fix the upper bound first, so rows landing while this run is in progress wait for the next one
+        high_watermark = new_rows(tables[table], table, watermark).agg(max(timestamp_column)).first()[0] or watermark
+        new_tables[table] = new_rows(tables[table], table, watermark, high_watermark)
+        watermarks[table] = high_watermark.isoformat() if high_watermark else None
+
+    # The rentals that were still out at the last run, as they are now. Both this and the new rentals
+    # are read once, so a return landing during the run cannot be counted and also kept open.
+    open_rentals_df = read_aggregate(spark, state_dir, state, OPEN_RENTALS)
+    if open_rentals_df is None:
+        checked_df = tables["rental"].limit(0)
+    else:
+        checked_df = rentals_on_days(tables["rental"], distinct_days(open_rentals_df)) \
+            .join(open_rentals_df.select("rental_id"), "rental_id", "left_semi")
+    checked_df = checked_df.persist(StorageLevel.MEMORY_AND_DISK)
+    returned = col("return_date").isNotNull()
+    if watermarks == {table: state["watermarks"].get(table) for table in PARTITIONS} \
+            and checked_df.filter(returned).isEmpty():
+        checked_df.unpersist()
+        print("No new rentals or payments, and no returns, since the last run")
+        return state
+
+    new_rentals = new_tables["rental"].persist(StorageLevel.MEMORY_AND_DISK)
+    previous = {name: read_aggregate(spark, state_dir, state, name) for name in AGGREGATES}
+    # A new payment may be for a rental of this run, so the lookup uses the ranges including it
+    ranges_delta_df = rental_id_ranges(new_rentals)
+    ranges_df = merge(previous["rental_id_ranges"], ranges_delta_df, *AGGREGATES["rental_id_ranges"])
+    delta_dfs = deltas(tables, new_rentals, new_rentals.filter(returned).unionByName(checked_df.filter(returned)),
+                       new_tables["payment"], paid_rentals(tables["rental"], new_tables["payment"], ranges_df))
+    delta_dfs["rental_id_ranges"] = ranges_delta_df
+    tables_to_write = {
+        name: merge(previous[name], delta_dfs[name], keys, values)
+        for name, (keys, values) in AGGREGATES.items()
+    }
+    tables_to_write[OPEN_RENTALS] = new_rentals.filter(~returned).unionByName(checked_df.filter(~returned)) \
+        .select("rental_id", PARTITIONS["rental"][0])
+    state = write_state(state_dir, state, tables_to_write, watermarks)
+    new_rentals.unpersist()
+    checked_df.unpersist()
+    return state
+
+
+def show_results(spark, tables, state_dir, state):
+    """Prints problems 2, 3 and 7 from the stored aggregates alone."""
+    aggregates = {name: read_aggregate(spark, state_dir, state, name) for name in AGGREGATES}
+
+    print("\n--- 2. The 10 actors whose movies rented the most, sorted in descending order ---")
+    aggregates["rentals_per_actor"].join(broadcast(tables["actor"]), "actor_id") \
+        .select("actor_id", "first_name", "last_name", "rental_count") \
+        .sort(col("rental_count").desc()) \
+        .limit(10) \
+        .show()
+
+    print("\n--- 3. Category of movies on which the most money was spent ---")
+    aggregates["spend_per_category"].select(col("category_name").alias("name"), "total_spent") \
+        .sort(col("total_spent").desc()) \
+        .limit(1) \
+        .show()
+
+    print("\n--- 7. Category of movies with highest total rental hours per city filter ---")
+    top_category_by_city_filter(aggregates["hours_per_category_city"], city_predicates(), value="total_hours") \
+        .show(truncate=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Keep the Sakila rental aggregates up to date by processing only new rentals and payments.")
+    parser.add_argument("--source", choices=["sample", "parquet", "jdbc"], default="parquet")
+    parser.add_argument("--path", help="Parquet dataset directory, or JDBC url such as jdbc:sqlite:sakila.db")
+    parser.add_argument("--state", required=True, help="Local directory for the aggregate state and watermarks")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the stored state and start from scratch")
+    args = parser.parse_args()
+    if args.source != "sample" and not args.path:
+        parser.error(f"--path is required with --source {args.source}")
+
+    spark = SparkSession.builder \
+        .appName("SakilaIncremental") \
+        .getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+
+    if args.rebuild:
+        shutil.rmtree(args.state, ignore_errors=True)
+    os.makedirs(args.state, exist_ok=True)
+
+    tables = load_tables(spark, args.source, args.path)
+    started = time.perf_counter()
+    state = run_increment(spark, tables, args.state)
+    print(f"State version {state['version']}, watermarks {state['watermarks']}, "
+          f"updated in {time.perf_counter() - started:.1f}s")
+    if state["version"]:
+        show_results(spark, tables, args.state, state)
+
+    spark.stop()
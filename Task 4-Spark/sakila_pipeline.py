@@ -0,0 +1,81 @@
+from pyspark.sql.functions import array, broadcast, col, count, element_at, explode, filter, lit, row_number, sum, when
+from pyspark.sql.window import Window
+
+
+def rental_facts(rental_df, inventory_df):
+    """One row per rental, with the rented film and rental length in hours."""
+    return rental_df.join(inventory_df, "inventory_id") \
+        .withColumn("rental_duration_hours",
+                    (col("return_date").cast("long") - col("rental_date").cast("long")) / 3600) \
+        .select("rental_id", "film_id", "customer_id", "rental_duration_hours")
+
+
+def rental_categories(rental_facts_df, film_category_df, category_df):
+    """One row per rental and category of the rented film (a film may belong to several categories)."""
+    return rental_facts_df.join(film_category_df, "film_id") \
+        .join(broadcast(category_df), "category_id") \
+        .select("rental_id", "customer_id", col("name").alias("category_name"), "rental_duration_hours")
+
+
+def rental_cities(rental_category_df, customer_df, address_df, city_df):
+    """Attaches the renting customer's city to each rental/category row."""
+    return rental_category_df.join(customer_df.select("customer_id", "address_id"), "customer_id") \
+        .join(address_df.select("address_id", "city_id"), "address_id") \
+        .join(broadcast(city_df), "city_id") \
+        .select(
+            col("city"),
+            col("category_name"),
+            col("rental_duration_hours")
+        )
+
+
+def top_actors_in_category(category_df, film_category_df, film_actor_df, actor_df, category="Children", top=3):
+    """
+    Returns the actors with the `top` highest numbers of movies in `category`, all ties included, as
+    (first_name, last_name, movie_count) sorted by movie_count descending. Only the few distinct
+    counts are ranked, so no step gathers every actor into a single task.
+    """
+    category_id_df = category_df.filter(col("name") == category).select("category_id")
+    movie_counts = film_category_df.join(broadcast(category_id_df), "category_id") \
+        .join(film_actor_df, "film_id") \
+        .join(broadcast(actor_df), "actor_id") \
+        .groupBy("actor_id", "first_name", "last_name") \
+        .agg(count("film_id").alias("movie_count"))
+    top_counts = movie_counts.select("movie_count").distinct() \
+        .orderBy(col("movie_count").desc()) \
+        .limit(top)
+    return movie_counts.join(broadcast(top_counts), "movie_count") \
+        .select("first_name", "last_name", "movie_count") \
+        .orderBy(col("movie_count").desc())
+
+
+def city_predicates():
+    """The named city slices of problem 7."""
+    return [
+        ("city starts with 'A'", col("city").startswith("A")),
+        ("city contains '-'", col("city").contains("-")),
+    ]
+
+
+def top_category_by_city_filter(rental_city_category_df, city_predicates, value="rental_duration_hours"):
+    """
+    Returns the category with the highest total `value` for each of the named city predicates, as one
+    row per predicate (city_filter, category_name, total_hours). Every predicate is evaluated in a
+    single pass: each row is tagged with the predicates it matches and then aggregated by (predicate,
+    category), so adding a predicate does not re-run the joins behind `rental_city_category_df`.
+    Ties on total_hours go to the first category name.
+    """
+    names = array(*[lit(name) for name, _ in city_predicates])
+    # Index of every predicate the row's city matches; rows matching none are dropped by explode
+    matches = array(*[when(predicate, lit(index)) for index, (_, predicate) in enumerate(city_predicates)])
+    totals = rental_city_category_df \
+        .select(explode(filter(matches, lambda index: index.isNotNull())).alias("predicate"),
+                "category_name", value) \
+        .groupBy("predicate", "category_name") \
+        .agg(sum(value).alias("total_hours"))
+
+    best_first = Window.partitionBy("predicate").orderBy(col("total_hours").desc(), col("category_name"))
+    return totals.withColumn("position", row_number().over(best_first)) \
+        .filter(col("position") == 1) \
+        .orderBy("predicate") \
+        .select(element_at(names, col("predicate") + 1).alias("city_filter"), "category_name", "total_hours")
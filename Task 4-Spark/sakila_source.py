@@ -0,0 +1,244 @@
+from datetime import date, datetime, timedelta
+
+from pyspark.sql.functions import col, to_date
+from pyspark.sql.types import (
+    DateType, DoubleType, IntegerType, LongType, StringType, StructField, StructType, TimestampType,
+)
+
+
+def schema(*fields):
+    """Builds a StructType from (name, type) pairs."""
+    return StructType([StructField(name, data_type) for name, data_type in fields])
+
+
+# Explicit schemas, so no source ever needs a sampling pass to infer column types
+SCHEMAS = {
+    "actor": schema(("actor_id", IntegerType()), ("first_name", StringType()), ("last_name", StringType())),
+    "category": schema(("category_id", IntegerType()), ("name", StringType())),
+    "film": schema(("film_id", IntegerType()), ("title", StringType()), ("rental_duration", IntegerType()),
+                   ("rental_rate", DoubleType()), ("length", IntegerType()), ("replacement_cost", DoubleType())),
+    "film_actor": schema(("actor_id", IntegerType()), ("film_id", IntegerType())),
+    "film_category": schema(("film_id", IntegerType()), ("category_id", IntegerType())),
+    "inventory": schema(("inventory_id", IntegerType()), ("film_id", IntegerType()), ("store_id", IntegerType())),
+    "customer": schema(("customer_id", IntegerType()), ("store_id", IntegerType()), ("first_name", StringType()),
+                       ("last_name", StringType()), ("email", StringType()), ("address_id", IntegerType()),
+                       ("active", IntegerType())),
+    "address": schema(("address_id", IntegerType()), ("address", StringType()), ("district", StringType()),
+                      ("city_id", IntegerType())),
+    "city": schema(("city_id", IntegerType()), ("city", StringType())),
+    "rental": schema(("rental_id", LongType()), ("rental_date", TimestampType()), ("inventory_id", IntegerType()),
+                     ("customer_id", IntegerType()), ("return_date", TimestampType())),
+    "payment": schema(("payment_id", LongType()), ("customer_id", IntegerType()), ("rental_id", LongType()),
+                      ("amount", DoubleType()), ("payment_date", TimestampType())),
+}
+
+# The fact tables are partitioned by the day of their event: (partition column, timestamp it is derived from).
+# Filtering on the partition column lets Spark skip whole directories of a Parquet source.
+PARTITIONS = {
+    "rental": ("rental_day", "rental_date"),
+    "payment": ("payment_day", "payment_date"),
+}
+
+# --- Sample data ---
+# The small demo dataset the analyses were written against; used when no real source is given
+
+SAMPLE_DATA = {
+    "actor": [
+        (1, "PENELOPE", "GUINESS"), (2, "NICK", "WAHLBERG"), (3, "ED", "CHASE"),
+        (4, "JENNIFER", "DAVIS"), (5, "JOHNNY", "LOLLOBRIGIDA"), (6, "JOE", "SWANK"),
+        (7, "JON", "FAWCETT"), (8, "ANGELA", "HUDSON"), (9, "KIRSTEN", "PALTROW"),
+        (10, "BETTE", "NICHOLSON"), (11, "GRACE", "KELLY"), (12, "JOHN", "TRAVOLTA"),
+        (13, "WOODY", "ALLEN"), (14, "SANDRA", "BULLOCK"), (15, "TOM", "HANKS"),
+        (16, "MERYL", "STREEP"), (17, "LEONARDO", "DICAPRIO"), (18, "JULIA", "ROBERTS")
+    ],
+    "category": [
+        (1, "Action"), (2, "Animation"), (3, "Children"), (4, "Classics"), (5, "Comedy"),
+        (6, "Documentary"), (7, "Drama"), (8, "Family"), (9, "Foreign"), (10, "Games"),
+        (11, "Horror"), (12, "Music"), (13, "New"), (14, "Sci-Fi"), (15, "Sports"), (16, "Travel")
+    ],
+    "film": [
+        (101, "MOVIE A", 3, 4.99, 90, 19.99), (102, "MOVIE B", 7, 2.99, 120, 24.99),
+        (103, "MOVIE C", 5, 0.99, 150, 9.99), (104, "MOVIE D", 3, 1.99, 85, 12.99),
+        (105, "MOVIE E", 6, 3.99, 110, 15.99), (106, "MOVIE F", 4, 2.99, 100, 17.99),
+        (107, "MOVIE G", 3, 4.99, 95, 21.99), (108, "MOVIE H", 7, 0.99, 130, 8.99),
+        (109, "MOVIE I", 5, 1.99, 140, 10.99), (110, "MOVIE J", 3, 2.99, 75, 13.99),
+        (111, "MOVIE K", 6, 3.99, 105, 16.99), (112, "MOVIE L", 4, 4.99, 115, 20.99),
+        (113, "MOVIE M", 3, 0.99, 88, 7.99), (114, "MOVIE N", 7, 1.99, 160, 11.99),
+        (115, "MOVIE O", 5, 2.99, 125, 14.99), (116, "MOVIE P", 3, 3.99, 92, 18.99),
+        (117, "MOVIE Q", 6, 4.99, 108, 22.99), (118, "MOVIE R", 4, 0.99, 135, 6.99)
+    ],
+    "film_actor": [
+        (1, 101), (2, 101), (3, 102), (4, 103), (1, 104), (5, 104), (6, 105), (7, 106),
+        (8, 107), (9, 108), (10, 109), (11, 110), (12, 111), (13, 112), (14, 113),
+        (15, 114), (16, 115), (17, 116), (18, 117), (1, 118), (3, 103), (5, 105),
+        (1, 102), (2, 103), (3, 104), (4, 105), (5, 106), (6, 107), (7, 108), (8, 109),
+        (9, 110), (10, 111), (11, 112), (12, 113), (13, 114), (14, 115), (15, 116),
+        (16, 117), (17, 118), (18, 101), (1, 103) # Additional entries for 'Children' category for actor 1
+    ],
+    "film_category": [
+        (101, 1), (102, 3), (103, 5), (104, 3), (105, 7), (106, 2), (107, 4), (108, 6),
+        (109, 8), (110, 10), (111, 12), (112, 14), (113, 16), (114, 1), (115, 3),
+        (116, 5), (117, 7), (118, 9), (103, 3) # MOVIE C is also Children for Actor 1 in Children test
+    ],
+    # Some movies are not in the inventory, for problem 4
+    "inventory": [
+        (1, 101, 1), (2, 102, 1), (3, 103, 1), (4, 104, 2), (5, 105, 2),
+        (6, 101, 1), (7, 102, 1), (8, 103, 1), (9, 104, 2), (10, 105, 2),
+        (11, 106, 1), (12, 107, 1), (13, 108, 1), (14, 109, 2), (15, 110, 2),
+        (16, 111, 1), (17, 112, 1), (18, 113, 1) # Note: 114, 115, 116, 117, 118 are not in inventory
+    ],
+    "customer": [
+        (1, 1, "MARY", "SMITH", "mary.smith@example.com", 1, 1),
+        (2, 1, "PATRICIA", "JOHNSON", "patricia.johnson@example.com", 2, 1),
+        (3, 1, "LINDA", "WILLIAMS", "linda.williams@example.com", 3, 0),
+        (4, 2, "BARBARA", "JONES", "barbara.jones@example.com", 4, 1),
+        (5, 2, "ELIZABETH", "BROWN", "elizabeth.brown@example.com", 5, 0),
+        (6, 1, "JENNIFER", "DAVIS", "jennifer.davis@example.com", 6, 1),
+        (7, 2, "MARIA", "MILLER", "maria.miller@example.com", 7, 0),
+        (8, 1, "JOHN", "DOE", "john.doe@example.com", 8, 1),
+        (9, 2, "JANE", "SMITH", "jane.smith@example.com", 9, 0)
+    ],
+    "address": [
+        (1, "123 Main St", "California", 1), (2, "456 Oak Ave", "Texas", 2),
+        (3, "789 Pine Ln", "Florida", 3), (4, "101 Maple Dr", "California", 1),
+        (5, "202 Birch Rd", "New York", 4), (6, "303 Cedar Blvd", "California", 1),
+        (7, "404 Elm Pk", "Texas", 2), (8, "505 Willow Way", "Florida", 3),
+        (9, "606 Aspen Ct", "New-York", 4) # City with hyphen
+    ],
+    "city": [
+        (1, "A-City"), (2, "Another-Town"), (3, "B-City"), (4, "New York")
+    ],
+    # Dates are written as strings for readability and parsed when the DataFrame is built
+    "rental": [
+        (1, "2023-01-01 10:00:00", 1, 1, "2023-01-03 12:00:00"), # MOVIE A (Film_id 101)
+        (2, "2023-01-02 11:00:00", 2, 2, "2023-01-05 15:00:00"), # MOVIE B (Film_id 102)
+        (3, "2023-01-03 09:00:00", 3, 3, "2023-01-07 10:00:00"), # MOVIE C (Film_id 103)
+        (4, "2023-01-04 14:00:00", 4, 4, "2023-01-06 18:00:00"), # MOVIE D (Film_id 104)
+        (5, "2023-01-05 16:00:00", 5, 5, "2023-01-08 20:00:00"), # MOVIE E (Film_id 105)
+        (6, "2023-01-06 10:30:00", 6, 1, "2023-01-09 11:30:00"), # MOVIE A (Film_id 101)
+        (7, "2023-01-07 12:45:00", 7, 2, "2023-01-11 13:45:00"), # MOVIE B (Film_id 102)
+        (8, "2023-01-08 08:00:00", 8, 3, "2023-01-10 09:00:00"), # MOVIE C (Film_id 103)
+        (9, "2023-01-09 13:00:00", 9, 4, "2023-01-12 14:00:00"), # MOVIE D (Film_id 104)
+        (10, "2023-01-10 15:00:00", 10, 5, "2023-01-13 16:00:00"),# MOVIE E (Film_id 105)
+        (11, "2023-01-11 09:00:00", 11, 6, "2023-01-14 10:00:00"),# MOVIE F (Film_id 106)
+        (12, "2023-01-12 11:00:00", 12, 7, "2023-01-15 12:00:00"),# MOVIE G (Film_id 107)
+        (13, "2023-01-13 13:00:00", 13, 8, "2023-01-16 14:00:00"),# MOVIE H (Film_id 108)
+        (14, "2023-01-14 15:00:00", 14, 9, "2023-01-17 16:00:00") # MOVIE I (Film_id 109)
+    ],
+    "payment": [
+        (1, 1, 1, 4.99, "2023-01-03 13:00:00"), (2, 2, 2, 2.99, "2023-01-05 16:00:00"),
+        (3, 3, 3, 0.99, "2023-01-07 11:00:00"), (4, 4, 4, 1.99, "2023-01-06 19:00:00"),
+        (5, 5, 5, 3.99, "2023-01-08 21:00:00"), (6, 1, 6, 4.99, "2023-01-09 12:30:00"),
+        (7, 2, 7, 2.99, "2023-01-11 14:45:00"), (8, 3, 8, 0.99, "2023-01-10 10:00:00"),
+        (9, 4, 9, 1.99, "2023-01-12 15:00:00"), (10, 5, 10, 3.99, "2023-01-13 17:00:00"),
+        (11, 6, 11, 2.99, "2023-01-14 11:00:00"), (12, 7, 12, 4.99, "2023-01-15 13:00:00"),
+        (13, 8, 13, 0.99, "2023-01-16 15:00:00"), (14, 9, 14, 1.99, "2023-01-17 17:00:00")
+    ],
+}
+
+
+def parse_sample_row(row, table_schema):
+    """Converts the sample's timestamp strings to datetimes so the row matches the table schema; None stays NULL."""
+    return tuple(datetime.fromisoformat(value) if isinstance(field.dataType, TimestampType) and value is not None
+                 else value for value, field in zip(row, table_schema.fields))
+
+
+def with_partition_column(table, df):
+    """Adds the day partition column to a fact table read from a source that does not store it."""
+    if table not in PARTITIONS:
+        return df
+    day_column, timestamp_column = PARTITIONS[table]
+    return df.withColumn(day_column, to_date(col(timestamp_column)))
+
+
+def sample_tables(spark):
+    """Builds every table from SAMPLE_DATA on the driver."""
+    return {
+        table: with_partition_column(table, spark.createDataFrame(
+            [parse_sample_row(row, SCHEMAS[table]) for row in rows], SCHEMAS[table]))
+        for table, rows in SAMPLE_DATA.items()
+    }
+
+
+def parquet_tables(spark, path):
+    """Reads every table from `<path>/<table>`, as written by write_parquet."""
+    tables = {}
+    for table, table_schema in SCHEMAS.items():
+        if table in PARTITIONS:
+            table_schema = StructType(table_schema.fields + [StructField(PARTITIONS[table][0], DateType())])
+        tables[table] = spark.read.schema(table_schema).parquet(f"{path}/{table}")
+    return tables
+
+
+def jdbc_tables(spark, url, properties=None):
+    """
+    Reads every table over JDBC, e.g. from a SQLite file with url "jdbc:sqlite:sakila.db" (the
+    org.xerial:sqlite-jdbc driver must be on the classpath). Column types come from SCHEMAS
+    through the customSchema option rather than from the database's metadata.
+    """
+    tables = {}
+    for table, table_schema in SCHEMAS.items():
+        custom_schema = ", ".join(f"{field.name} {field.dataType.simpleString()}" for field in table_schema.fields)
+        df = spark.read.jdbc(url, table, properties=dict(properties or {}, customSchema=custom_schema))
+        tables[table] = with_partition_column(table, df.select(table_schema.fieldNames()))
+    return tables
+
+
+def filter_dates(tables, since=None, until=None):
+    """
+    Restricts rental and payment to events on days in [since, until]. The predicate is applied to the
+    day partition column, which prunes Parquet partitions, and to the event timestamp itself, which
+    is pushed down to Parquet row groups and into the WHERE clause of a JDBC query.
+    """
+    if since is None and until is None:
+        return tables
+    tables = dict(tables)
+    for table, (day_column, timestamp_column) in PARTITIONS.items():
+        df = tables[table]
+        if since is not None:
+            start = datetime.combine(since, datetime.min.time())
+            df = df.filter((col(day_column) >= since) & (col(timestamp_column) >= start))
+        if until is not None:
+            end = datetime.combine(until + timedelta(days=1), datetime.min.time())
+            df = df.filter((col(day_column) <= until) & (col(timestamp_column) < end))
+        tables[table] = df
+    return tables
+
+
+def load_tables(spark, source="sample", path=None, since=None, until=None):
+    """
+    Returns a dict of table name -> DataFrame for the Sakila tables used by the analyses.
+    `source` is "sample" (the built-in demo data), "parquet" (`path` is the dataset directory)
+    or "jdbc" (`path` is the JDBC url). `since` and `until` are optional dates bounding rental and payment.
+    """
+    if source == "sample":
+        tables = sample_tables(spark)
+    elif source == "parquet":
+        tables = parquet_tables(spark, path)
+    elif source == "jdbc":
+        tables = jdbc_tables(spark, path)
+    else:
+        raise ValueError(f"Unknown source {source!r}; expected sample, parquet or jdbc")
+    return filter_dates(tables, since, until)
+
+
+def write_parquet(tables, path, mode="overwrite"):
+    """Writes every table to `<path>/<table>` as Parquet, with rental and payment partitioned by day."""
+    for table, df in tables.items():
+        writer = df.write.mode(mode)
+        if table in PARTITIONS:
+            writer = writer.partitionBy(PARTITIONS[table][0])
+        writer.parquet(f"{path}/{table}")
+
+
+def write_jdbc(tables, url, mode="overwrite", properties=None):
+    """Writes every table over JDBC, leaving out the derived day partition columns."""
+    for table, df in tables.items():
+        # SQLite allows a single writer, so the rows go through one connection
+        df.select(SCHEMAS[table].fieldNames()).coalesce(1) \
+            .write.jdbc(url, table, mode=mode, properties=dict(properties or {}))
+
+
+def parse_date(value):
+    """argparse type for YYYY-MM-DD dates."""
+    return date.fromisoformat(value)
@@ -0,0 +1,128 @@
+import json
+import time
+import urllib.request
+
+# Settings that change how the analyses are planned; always recorded in the report
+TRACKED_SETTINGS = (
+    "spark.sql.adaptive.enabled",
+    "spark.sql.autoBroadcastJoinThreshold",
+    "spark.sql.shuffle.partitions",
+)
+
+
+def fetch_status(spark, endpoint):
+    """Fetches one endpoint of the Spark UI REST API for the running application."""
+    sc = spark.sparkContext
+    url = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/{endpoint}"
+    with urllib.request.urlopen(url) as response:
+        return json.load(response)
+
+
+def job_group_metrics(spark, group):
+    """
+    Summarizes the Spark jobs run under a job group (see SparkContext.setJobGroup): number of jobs,
+    stages that ran, stages skipped because their shuffle output was reused, shuffle and spill bytes,
+    and the largest peak execution memory of any stage. Requires the Spark UI, which is on by default
+    in local mode.
+    """
+    # Job and stage events reach the UI's status store asynchronously; wait until they have settled
+    tracker = spark.sparkContext.statusTracker()
+    job_ids = set(tracker.getJobIdsForGroup(group))
+    for _ in range(50):
+        jobs = [job for job in fetch_status(spark, "jobs") if job["jobId"] in job_ids]
+        if len(jobs) == len(job_ids) and all(job["status"] != "RUNNING" for job in jobs):
+            break
+        time.sleep(0.1)
+
+    stage_ids = {stage_id for job in jobs for stage_id in job["stageIds"]}
+    stages = [stage for stage in fetch_status(spark, "stages") if stage["stageId"] in stage_ids]
+    ran = [stage for stage in stages if stage["status"] == "COMPLETE"]
+    return {
+        "jobs": len(jobs),
+        "stages": len(ran),
+        "skipped_stages": sum(job["numSkippedStages"] for job in jobs),
+        "shuffle_stages": sum(stage["shuffleWriteBytes"] > 0 for stage in ran),
+        "shuffle_read_bytes": sum(stage["shuffleReadBytes"] for stage in ran),
+        "shuffle_write_bytes": sum(stage["shuffleWriteBytes"] for stage in ran),
+        "memory_spilled_bytes": sum(stage["memoryBytesSpilled"] for stage in ran),
+        "disk_spilled_bytes": sum(stage["diskBytesSpilled"] for stage in ran),
+        "peak_execution_memory": max((stage["peakExecutionMemory"] for stage in ran), default=0),
+    }
+
+
+def executor_peak_memory(spark):
+    """Returns the peak JVM and Spark-managed memory of each executor (the driver in local mode) so far."""
+    peaks = {}
+    for executor in fetch_status(spark, "executors"):
+        metrics = executor.get("peakMemoryMetrics") or {}
+        peaks[executor["id"]] = {
+            "jvm_heap_bytes": metrics.get("JVMHeapMemory", 0),
+            "jvm_off_heap_bytes": metrics.get("JVMOffHeapMemory", 0),
+            "execution_memory_bytes": metrics.get("OnHeapExecutionMemory", 0) + metrics.get("OffHeapExecutionMemory", 0),
+            "storage_memory_bytes": metrics.get("OnHeapStorageMemory", 0) + metrics.get("OffHeapStorageMemory", 0),
+        }
+    return peaks
+
+
+def run_job(spark, name, description, job):
+    """Runs `job()` under its own job group, so its Spark jobs can be attributed to it, and returns its wall time."""
+    spark.sparkContext.setJobGroup(name, description)
+    started = time.perf_counter()
+    job()
+    elapsed = time.perf_counter() - started
+    spark.sparkContext.setJobGroup(None, None)
+    return elapsed
+
+
+def collect_report(spark, wall_times, conf_keys=()):
+    """
+    Builds the metrics report for the jobs in `wall_times` (job group name -> seconds): per-job metrics,
+    their totals, executor peak memory and the settings the run used, including any keys in `conf_keys`.
+    """
+    jobs = {name: dict(wall_seconds=seconds, **job_group_metrics(spark, name)) for name, seconds in wall_times.items()}
+    totals = {}
+    for metrics in jobs.values():
+        for key, value in metrics.items():
+            if key == "peak_execution_memory":
+                totals[key] = max(totals.get(key, 0), value)
+            else:
+                totals[key] = totals.get(key, 0) + value
+    settings = {key: spark.conf.get(key) for key in TRACKED_SETTINGS}
+    settings.update({key: spark.conf.get(key, None) for key in conf_keys})
+    return {
+        "application_id": spark.sparkContext.applicationId,
+        "spark_version": spark.version,
+        "master": spark.sparkContext.master,
+        "default_parallelism": spark.sparkContext.defaultParallelism,
+        "settings": settings,
+        "jobs": jobs,
+        "totals": totals,
+        "executors": executor_peak_memory(spark),
+    }
+
+
+def write_report(report, path):
+    """Writes a report from collect_report as JSON."""
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+def print_stage_report(report):
+    """Prints a per-job table of wall time, stages, shuffle and spill volume and peak memory, plus the totals."""
+    header = (f"{'job group':<24}{'seconds':>9}{'jobs':>6}{'stages':>8}{'skipped':>9}{'shuffles':>10}"
+              f"{'shuffle read':>14}{'shuffle write':>15}{'spilled':>10}{'peak memory':>13}")
+    print(header)
+    print("-" * len(header))
+    for name, metrics in report["jobs"].items():
+        print_metrics_row(name, metrics)
+    print("-" * len(header))
+    print_metrics_row("total", report["totals"])
+
+
+def print_metrics_row(label, metrics):
+    """Prints one row of the stage report."""
+    print(f"{label:<24}{metrics['wall_seconds']:>9.2f}{metrics['jobs']:>6}{metrics['stages']:>8}"
+          f"{metrics['skipped_stages']:>9}{metrics['shuffle_stages']:>10}{metrics['shuffle_read_bytes']:>14,}"
+          f"{metrics['shuffle_write_bytes']:>15,}{metrics['memory_spilled_bytes'] + metrics['disk_spilled_bytes']:>10,}"
+          f"{metrics['peak_execution_memory']:>13,}")
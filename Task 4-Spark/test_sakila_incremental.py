@@ -0,0 +1,88 @@
+import pytest
+
+pyspark = pytest.importorskip("pyspark")
+
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import count, sum
+
+from sakila_incremental import AGGREGATES, read_aggregate, run_increment
+from sakila_pipeline import rental_categories, rental_cities, rental_facts
+from sakila_source import SAMPLE_DATA, SCHEMAS, load_tables, parse_sample_row, with_partition_column, write_parquet
+
+
+@pytest.fixture(scope="module")
+def spark():
+    builder = SparkSession.builder \
+        .master("local[2]") \
+        .appName("SakilaIncrementalTest") \
+        .config("spark.sql.shuffle.partitions", "4") \
+        .config("spark.ui.enabled", "false") \
+        .config("spark.ui.showConsoleProgress", "false")
+    try:
+        spark = builder.getOrCreate()
+    except Exception as e:
+        # [JAVA_GATEWAY_EXITED] (or "Java gateway process exited" before Spark 3.4): no usable Java runtime
+        if "Java gateway" not in str(e):
+            raise
+        pytest.skip(f"cannot start a local Spark session: {e}")
+    spark.sparkContext.setLogLevel("ERROR")
+    yield spark
+    spark.stop()
+
+
+# Later data: rental 16 is still out, and payment 16 is a second payment for the old rental 2
+LATER_RENTALS = [(15, "2023-01-15 10:00:00", 1, 1, "2023-01-16 10:00:00"), (16, "2023-01-16 10:00:00", 2, 2, None)]
+LATER_PAYMENTS = [(15, 1, 15, 4.99, "2023-01-16 11:00:00"), (16, 2, 2, 1.00, "2023-01-16 12:00:00")]
+
+
+def write_source(spark, path, rentals, payments):
+    """Writes the sample data, with the given rentals and payments, as a Parquet source."""
+    data = dict(SAMPLE_DATA, rental=rentals, payment=payments)
+    tables = {
+        table: with_partition_column(table, spark.createDataFrame(
+            [parse_sample_row(row, SCHEMAS[table]) for row in rows], SCHEMAS[table]))
+        for table, rows in data.items()
+    }
+    write_parquet(tables, path)
+    return load_tables(spark, "parquet", path)
+
+
+def full_aggregates(tables):
+    """The aggregates computed from scratch over every row."""
+    facts_df = rental_facts(tables["rental"], tables["inventory"])
+    categories_df = rental_categories(facts_df, tables["film_category"], tables["category"])
+    return {
+        "rentals_per_actor": facts_df.join(tables["film_actor"], "film_id")
+        .groupBy("actor_id").agg(count("rental_id").alias("rental_count")),
+        "spend_per_category": tables["payment"].join(categories_df, "rental_id")
+        .groupBy("category_name").agg(sum("amount").alias("total_spent")),
+        "hours_per_category_city": rental_cities(categories_df, tables["customer"], tables["address"], tables["city"])
+        .groupBy("city", "category_name").agg(sum("rental_duration_hours").alias("total_hours"))
+        .filter("total_hours IS NOT NULL"),
+    }
+
+
+def rows(df):
+    return sorted(tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                  for row in df.collect())
+
+
+def test_increments_match_full_run(spark, tmp_path):
+    source, state_dir = str(tmp_path / "source"), str(tmp_path / "state")
+    # First run: the last three rentals are still out, and only the first ten are paid for
+    early_rentals = [row[:4] + (None,) if row[0] >= 12 else row for row in SAMPLE_DATA["rental"]]
+    state = run_increment(spark, write_source(spark, source, early_rentals, SAMPLE_DATA["payment"][:10]), state_dir)
+    assert rows(read_aggregate(spark, state_dir, state, "open_rentals").select("rental_id")) == [(12,), (13,), (14,)]
+
+    # Second run: those rentals have been returned and new rentals and payments have arrived
+    tables = write_source(spark, source, SAMPLE_DATA["rental"] + LATER_RENTALS, SAMPLE_DATA["payment"] + LATER_PAYMENTS)
+    state = run_increment(spark, tables, state_dir)
+    assert rows(read_aggregate(spark, state_dir, state, "open_rentals").select("rental_id")) == [(16,)]
+
+    expected = full_aggregates(tables)
+    for name in expected:
+        keys, values = AGGREGATES[name]
+        assert rows(read_aggregate(spark, state_dir, state, name)) == rows(expected[name].select(*keys, *values)), name
+
+    # Nothing changed since: no new state version
+    assert run_increment(spark, tables, state_dir) == state
@@ -0,0 +1,91 @@
+import pytest
+
+pyspark = pytest.importorskip("pyspark")
+
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import col, count, lit, when
+from pyspark.sql.window import Window
+
+from sakila_pipeline import top_actors_in_category
+from sakila_source import SAMPLE_DATA, SCHEMAS, sample_tables
+
+
+@pytest.fixture(scope="module")
+def spark():
+    builder = SparkSession.builder \
+        .master("local[2]") \
+        .appName("SakilaPipelineTest") \
+        .config("spark.sql.shuffle.partitions", "4") \
+        .config("spark.ui.enabled", "false") \
+        .config("spark.ui.showConsoleProgress", "false")
+    try:
+        spark = builder.getOrCreate()
+    except Exception as e:
+        # [JAVA_GATEWAY_EXITED] (or "Java gateway process exited" before Spark 3.4): no usable Java runtime
+        if "Java gateway" not in str(e):
+            raise
+        pytest.skip(f"cannot start a local Spark session: {e}")
+    spark.sparkContext.setLogLevel("ERROR")
+    yield spark
+    spark.stop()
+
+
+def collect_top_children_actors(category_df, film_category_df, film_actor_df, actor_df):
+    """Problem 5 as first written in spark_analysis.py, copied unchanged apart from returning the result."""
+    children_category_id = category_df.filter(col("name") == "Children").select("category_id").collect()[0][0]
+
+    children_movies_actors = film_category_df.filter(col("category_id") == children_category_id) \
+        .join(film_actor_df, "film_id") \
+        .join(actor_df, "actor_id") \
+        .groupBy("actor_id", "first_name", "last_name") \
+        .agg(count("film_id").alias("movie_count")) \
+        .withColumn("rank", col("movie_count").cast("long")) # Cast to long for window function tie handling
+
+    # Use a window function to get rank for ties
+    window_spec = Window.orderBy(col("movie_count").desc())
+    top_children_actors = children_movies_actors.withColumn("rank",
+                                                            when(col("movie_count") == lit(0), lit(None))
+                                                            .otherwise(col("movie_count"))) \
+        .orderBy(col("movie_count").desc())
+
+    # Filter for top 3 counts. Collect the top 3 counts first
+    top_3_counts = top_children_actors.select("movie_count").distinct().orderBy(col("movie_count").desc()).limit(3)
+    top_3_counts_list = [row.movie_count for row in top_3_counts.collect()]
+
+    # Filter original DataFrame for actors whose movie_count is in the top 3 counts list
+    final_top_children_actors = top_children_actors.filter(col("movie_count").isin(top_3_counts_list)) \
+        .select("first_name", "last_name", "movie_count") \
+        .orderBy(col("movie_count").desc())
+    return final_top_children_actors
+
+
+def results(df):
+    """Rows as a list, sorted within each movie_count, whose order among ties is unspecified."""
+    return sorted((tuple(row) for row in df.collect()), key=lambda row: (-row[2], row[0], row[1]))
+
+
+# Extra Children movie credits giving counts of 4 (actor 1), 3 (actors 3 and 4, a tie), 2 (actor 2)
+# and 1 (the rest), so the cut after the third highest count has to drop actors
+EXTRA_CREDITS = [(1, 115), (4, 102), (4, 104), (2, 102)]
+
+
+@pytest.mark.parametrize("extra_credits", [[], EXTRA_CREDITS], ids=["sample", "ties"])
+def test_top_children_actors_match_collect_version(spark, extra_credits):
+    tables = sample_tables(spark)
+    film_actor_df = spark.createDataFrame(SAMPLE_DATA["film_actor"] + extra_credits, SCHEMAS["film_actor"])
+    args = (tables["category"], tables["film_category"], film_actor_df, tables["actor"])
+
+    expected = results(collect_top_children_actors(*args))
+    assert results(top_actors_in_category(*args, "Children", 3)) == expected
+
+
+def test_top_children_actors_keep_ties(spark):
+    tables = sample_tables(spark)
+    film_actor_df = spark.createDataFrame(SAMPLE_DATA["film_actor"] + EXTRA_CREDITS, SCHEMAS["film_actor"])
+    top_df = top_actors_in_category(tables["category"], tables["film_category"], film_actor_df, tables["actor"])
+    assert results(top_df) == [
+        ("PENELOPE", "GUINESS", 4),
+        ("ED", "CHASE", 3),
+        ("JENNIFER", "DAVIS", 3),
+        ("NICK", "WAHLBERG", 2),
+    ]